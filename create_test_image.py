@@ -5,6 +5,7 @@ Create test grayscale images for ImageWave testing
 import numpy as np
 from PIL import Image
 import os
+import argparse
 
 def create_horizontal_gradient(width=400, height=200):
     """Create horizontal gradient from black (left) to white (right)"""
@@ -55,8 +56,64 @@ def create_circular_gradient(width=300, height=300):
     
     return gradient
 
+def create_synthetic_plate(width=4000, height=4000, seed=0, band_rows=512):
+    """Create a large plate mixing a gradient, stripes, a dark disc and noise
+
+    Built band by band with array operations, so sizes far beyond the
+    bundled images can be generated quickly and in bounded memory.
+    """
+    rng = np.random.default_rng(seed)
+    plate = np.empty((height, width), dtype=np.uint8)
+    x = np.linspace(0, 1, width)[np.newaxis, :]
+    center_x, center_y, radius = 0.6 * width, 0.4 * height, 0.25 * min(width, height)
+
+    for start in range(0, height, band_rows):
+        rows = np.arange(start, min(start + band_rows, height))[:, np.newaxis]
+        y = rows / max(height - 1, 1)
+
+        # Diagonal gradient with vertical stripes of varying frequency
+        intensity = 255 * (0.6 * x + 0.4 * y)
+        intensity *= 0.75 + 0.25 * np.sin(2 * np.pi * x * (20 + 60 * y))
+
+        # Dark disc with a soft edge
+        distance = np.hypot(np.arange(width)[np.newaxis, :] - center_x, rows - center_y)
+        intensity *= np.clip((distance - radius) / (0.1 * radius), 0.3, 1.0)
+
+        intensity += rng.normal(0, 8, intensity.shape)
+        plate[start:start + len(rows)] = np.clip(intensity, 0, 255).astype(np.uint8)
+
+    return plate
+
+def parse_size(text):
+    """Parse a WIDTHxHEIGHT size such as 8000x6000"""
+    try:
+        width, height = (int(value) for value in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    return width, height
+
+def create_synthetic_images(sizes, directory='.', seed=0):
+    """Save synthetic plates of the given (width, height) sizes; returns their paths"""
+    paths = []
+    for width, height in sizes:
+        filepath = os.path.join(directory, f"synthetic_{width}x{height}.png")
+        Image.fromarray(create_synthetic_plate(width, height, seed), mode='L').save(filepath)
+        print(f"Created: {filepath} ({width}x{height})")
+        paths.append(filepath)
+    return paths
+
 def main():
     """Create all test images"""
+    parser = argparse.ArgumentParser(description="Create test grayscale images for ImageWave.")
+    parser.add_argument('--synthetic', type=parse_size, nargs='+', metavar='WxH',
+                        help="create synthetic plates of these sizes instead of the standard images")
+    parser.add_argument('--output-dir', default='.', help="where to save the images (default: .)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        create_synthetic_images(args.synthetic, args.output_dir)
+        return
+
     print("Creating test grayscale images...")
     
     # Create test images
@@ -71,7 +128,7 @@ def main():
     # Save images
     for filename, image_array in images.items():
         image = Image.fromarray(image_array, mode='L')
-        filepath = os.path.join('.', filename)
+        filepath = os.path.join(args.output_dir, filename)
         image.save(filepath)
         print(f"Created: {filepath} ({image_array.shape[1]}x{image_array.shape[0]})")
     
@@ -1,31 +1,214 @@
-from flask import Flask, request, send_file, jsonify, send_from_directory
+from flask import Flask, Response, request, send_file, jsonify, send_from_directory
 import os
+import json
 import uuid
+import shutil
+import zipfile
+import threading
+import functools
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
+from werkzeug.serving import is_running_from_reloader
 from pathlib import Path
 
-from image_processor import ImageProcessor
-from sine_generator import SineGenerator
-from svg_generator import SVGGenerator
-from config import config
+from params import ConversionParams
+from pipeline import convert_image, convert_variants, compress_svg
+from batch import Batch
+from sweep import Sweep, expand_grid, run_sweep
+from job_queue import JobQueue, QueueFullError
+from result_cache import ResultCache
+from metrics import Metrics, StageTimer, server_timing
+from profiler import run_profiled
+from wave_store import open_wave_store
+from preview import preview_png
+from tiles import TilePyramid
+from config.config import PROFILING_ENABLED
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 2024 * 2024  # 16MB max file size
 
-# Initialize processors
-image_processor = ImageProcessor()
-sine_generator = SineGenerator(
-    width_min=config.STROKE_WIDTH_MIN,
-    width_max=config.STROKE_WIDTH_MAX
-)
-svg_generator = SVGGenerator()
+# The defaults, jobs, batches and sweeps below live in this process's
+# memory, so the server must run as a single process (with any number of
+# threads); the server process holds this lock from startup
+SERVER_LOCK_PATH = 'uploads/.server.lock'
+server_lock = None
+server_lock_guard = threading.Lock()
+
+# Conversions run in background worker processes
+job_queue = JobQueue()
+
+# Workers share the cache directory; hit/miss counters are kept here
+result_cache = ResultCache()
+
+# Stage latency histograms and volume counters for /metrics
+metrics = Metrics()
+
+# Defaults for new conversions; POST /config swaps in a new instance
+default_params = ConversionParams.from_config()
+default_params_lock = threading.Lock()
+
+# Batches by id; their files live in uploads/batch-<id>/
+batches = {}
+batches_lock = threading.Lock()
+
+# Parameter sweeps by id; their files live in uploads/sweep-<id>/
+sweeps = {}
+sweeps_lock = threading.Lock()
+
+# Finished batches and sweeps kept, each, before the oldest are removed with their files
+RUN_HISTORY_LIMIT = 100
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff'}
 
+def claim_server_process():
+    """Take the server lock for this process
+
+    Raises:
+        RuntimeError: if another server process holds it, as a second
+        process would not see this one's jobs or defaults
+    """
+    global server_lock
+    if fcntl is None:
+        return
+    with server_lock_guard:
+        if server_lock is None:
+            os.makedirs('uploads', exist_ok=True)
+            lock_file = open(SERVER_LOCK_PATH, 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                raise RuntimeError('Another ImageWave server process is already running from this directory; '
+                                   'run a single process with threads instead of several worker processes')
+            server_lock = lock_file
+
+def start_server():
+    """Claim the server lock and remove batches and sweeps an earlier process left behind
+
+    Their records lived in that process's memory, so they cannot be
+    reached anymore.
+    """
+    claim_server_process()
+    if os.path.isdir('uploads'):
+        for name in os.listdir('uploads'):
+            if name.startswith(('batch-', 'sweep-')):
+                shutil.rmtree(os.path.join('uploads', name), ignore_errors=True)
+
+def prune_runs(runs, lock, finished):
+    """Remove the oldest finished batches or sweeps beyond RUN_HISTORY_LIMIT, with their files"""
+    removed = []
+    with lock:
+        excess = len(runs) - RUN_HISTORY_LIMIT
+        for run_id, run in list(runs.items()):
+            if len(removed) >= excess:
+                break
+            if finished(run):
+                removed.append(runs.pop(run_id))
+    for run in removed:
+        shutil.rmtree(run.directory, ignore_errors=True)
+
+def job_finished(job_id):
+    # Jobs forgotten by the queue finished long ago
+    status = job_queue.status(job_id)
+    return status is None or status['status'] in ('done', 'failed')
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def find_original(file_id):
+    """Path of an uploaded image, or None if there is none"""
+    original_files = [f for f in os.listdir('uploads') if f.startswith(file_id) and allowed_file(f)]
+    return f"uploads/{original_files[0]}" if original_files else None
+
+def request_params(overrides=None):
+    """Build the parameters for a request from the defaults plus its overrides
+
+    Raises:
+        ValueError: if an override is invalid
+    """
+    with default_params_lock:
+        params = default_params
+    return params.with_overrides(overrides)
+
+def submit_conversion(file_id, image_path, params, profile=False):
+    """Queue a conversion of image_path with the given parameters
+
+    The SVG is written together with a gzip copy (.svgz) for serving, and
+    the wave data is kept in uploads/<file_id>.waves for previews. A
+    profiled conversion skips the result and stage caches so every stage
+    actually runs, and stores its profile under uploads/<file_id>.
+    """
+    svg_path = f"uploads/{file_id}.svg"
+    convert = functools.partial(convert_image, compress=True, wave_store=f"uploads/{file_id}.waves")
+    on_done = lambda result: finish_conversion(file_id, params, result)
+    if profile:
+        return job_queue.submit(
+            file_id, run_profiled, f"uploads/{file_id}",
+            functools.partial(convert, use_cache=False), image_path, svg_path, params,
+            on_done=on_done
+        )
+    stage_dir = f"uploads/{file_id}.stages"
+    return job_queue.submit(file_id, convert, image_path, svg_path, params, stage_dir, on_done=on_done)
+
+def profile_requested():
+    """Whether the request asks for a profiled conversion with ?profile=1
+
+    Raises:
+        PermissionError: if profiling was asked for but is not enabled
+    """
+    if request.args.get('profile') not in ('1', 'true'):
+        return False
+    if not PROFILING_ENABLED:
+        raise PermissionError("Profiling is disabled; set IMAGEWAVE_PROFILING=1 to enable it")
+    return True
+
+def finish_conversion(file_id, params, result):
+    """Record a finished job's cache lookup, metrics and the parameters its SVG was made with"""
+    result_cache.record(result['cache_hit'])
+    metrics.record_conversion(result)
+    params_path = f"uploads/{file_id}.json"
+    tmp_path = f"{params_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(params.to_dict(), f)
+    os.replace(tmp_path, params_path)
+
+def timed_response(endpoint, timer, body, status_code):
+    """JSON response carrying the request's stage timings in the body and a Server-Timing header"""
+    body['request_seconds'] = timer.rounded()
+    response = jsonify(body)
+    response.status_code = status_code
+    response.headers['Server-Timing'] = server_timing(timer.seconds)
+    metrics.record_request(endpoint, sum(timer.seconds.values()))
+    return response
+
+def used_params(file_id):
+    """Parameters the file's current SVG was made with, or the defaults if unknown"""
+    try:
+        with open(f"uploads/{file_id}.json") as f:
+            return ConversionParams(**json.load(f))
+    except (FileNotFoundError, TypeError, ValueError):
+        return request_params()
+
+def send_svg(svg_path, **kwargs):
+    """Send an SVG, as its gzip copy with Content-Encoding: gzip if the client accepts that
+
+    The .svgz is only used while it is at least as new as the SVG, so a
+    copy left over from an earlier conversion is never served.
+    """
+    svgz_path = svg_path + 'z'
+    use_svgz = (request.accept_encodings['gzip'] > 0 and os.path.exists(svgz_path)
+                and os.path.getmtime(svgz_path) >= os.path.getmtime(svg_path))
+    response = send_file(svgz_path if use_svgz else svg_path, mimetype='image/svg+xml', **kwargs)
+    if use_svgz:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/')
 def serve_index():
     """Serve the web interface"""
@@ -38,7 +221,8 @@ def serve_static(filename):
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle image upload and conversion"""
+    """Handle image upload and queue its conversion"""
+    timer = StageTimer()
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
     
@@ -49,6 +233,14 @@ def upload_file():
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
     
+    try:
+        params = request_params(request.form)
+        profile = profile_requested()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+    
     try:
         # Generate unique filename
         file_id = str(uuid.uuid4())
@@ -57,162 +249,404 @@ def upload_file():
         
         # Save uploaded file
         upload_path = f"uploads/{file_id}.{file_ext}"
-        file.save(upload_path)
+        with timer.stage('save'):
+            file.save(upload_path)
         
-        # Process image
-        processed_data = image_processor.process_image(upload_path)
-        
-        # Generate sine waves
-        sine_waves = sine_generator.generate_sine_waves(processed_data)
-        
-        # Generate SVG
-        svg_content = svg_generator.generate_optimized_svg(
-            sine_waves, 
-            processed_data['width'], 
-            processed_data['height']
-        )
+        # Queue the conversion and return straight away
+        with timer.stage('submit'):
+            job = submit_conversion(file_id, upload_path, params, profile)
         
-        # Save SVG file
-        svg_path = f"uploads/{file_id}.svg"
-        with open(svg_path, 'w') as f:
-            f.write(svg_content)
-        
-        return jsonify({
+        return timed_response('upload', timer, {
             'id': file_id,
+            'job_id': file_id,
+            'status': job['status'],
+            'params': params.to_dict(),
             'original_image': f'/uploads/{file_id}.{file_ext}',
-            'svg_file': f'/uploads/{file_id}.svg',
-            'width': processed_data['width'],
-            'height': processed_data['height'],
-            'num_lines': processed_data['num_lines']
-        })
+            'svg_file': f'/uploads/{file_id}.svg'
+        }, 202)
     
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    """Serve uploaded files"""
+    """Serve uploaded files, SVGs compressed where possible"""
+    svg_path = safe_join('uploads', filename)
+    if filename.endswith('.svg') and svg_path is not None and os.path.exists(svg_path):
+        return send_svg(svg_path)
     return send_from_directory('uploads', filename)
 
 @app.route('/convert/<file_id>')
 def get_conversion_status(file_id):
-    """Get conversion status and results"""
+    """Get conversion status, progress and timings of the latest job for a file
+
+    Once the job is done, its pipeline stage timings are also sent in a
+    Server-Timing header.
+    """
+    status = job_queue.status(file_id)
+    if status is not None:
+        if status['status'] != 'done':
+            return jsonify(status)
+
+        status['svg_file'] = f'/uploads/{file_id}.svg'
+        if 'profile_seconds' in status:
+            status['profile'] = {
+                'stats': f'/profile/{file_id}/stats',
+                'allocations': f'/profile/{file_id}/allocations'
+            }
+        response = jsonify(status)
+        stage_seconds = dict(status.get('stage_seconds', {}))
+        stage_seconds['queue'] = status['timings']['queued_seconds']
+        response.headers['Server-Timing'] = server_timing(stage_seconds)
+        return response
+
+    # Converted before the server was (re)started
     svg_path = f"uploads/{file_id}.svg"
     if os.path.exists(svg_path):
         return jsonify({
-            'status': 'completed',
+            'id': file_id,
+            'status': 'done',
             'svg_file': f'/uploads/{file_id}.svg'
         })
-    else:
-        return jsonify({'status': 'processing'})
+    return jsonify({'error': 'Job not found'}), 404
 
 @app.route('/download/<file_id>')
 def download_svg(file_id):
-    """Download generated SVG file with configuration settings in filename"""
+    """Download generated SVG file with its conversion parameters in the filename
+
+    ?format=svgz downloads the gzip-compressed .svgz file instead.
+    """
     svg_path = f"uploads/{file_id}.svg"
-    if os.path.exists(svg_path):
-        # Create filename with current configuration settings
-        config_suffix = f"_fm{config.FREQUENCY_MIN}_fx{config.FREQUENCY_MAX}_am{config.AMPLITUDE_MIN}_ax{config.AMPLITUDE_MAX}_sm{config.STROKE_WIDTH_MIN}_sx{config.STROKE_WIDTH_MAX}_lh{config.LINE_HEIGHT}"
-        # Replace dots with 'p' to avoid file extension confusion
-        config_suffix = config_suffix.replace('.', 'p')
-        download_filename = f"{file_id}{config_suffix}.svg"
-
-        return send_file(svg_path, as_attachment=True, download_name=download_filename)
-    else:
+    file_format = request.args.get('format', 'svg')
+    if file_format not in ('svg', 'svgz'):
+        return jsonify({'error': f'Unknown format: {file_format}'}), 400
+    if not os.path.exists(svg_path):
         return jsonify({'error': 'File not found'}), 404
 
+    download_filename = f"{file_id}{used_params(file_id).filename_suffix()}.{file_format}"
+    if file_format == 'svg':
+        return send_svg(svg_path, as_attachment=True, download_name=download_filename)
+
+    svgz_path = svg_path + 'z'
+    if not os.path.exists(svgz_path) or os.path.getmtime(svgz_path) < os.path.getmtime(svg_path):
+        # Converted before .svgz copies were written
+        compress_svg(svg_path)
+    return send_file(svgz_path, mimetype='image/svg+xml', as_attachment=True, download_name=download_filename)
+
+@app.route('/profile/<file_id>/<kind>')
+def download_profile(file_id, kind):
+    """Download the pstats dump ('stats') or allocation report ('allocations') of a profiled conversion"""
+    extensions = {'stats': 'prof', 'allocations': 'alloc.txt'}
+    if kind not in extensions:
+        return jsonify({'error': 'Unknown profile kind'}), 404
+
+    filename = f"{secure_filename(file_id)}.{extensions[kind]}"
+    if not os.path.exists(os.path.join('uploads', filename)):
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_from_directory('uploads', filename, as_attachment=True)
+
+@app.route('/preview/<file_id>.png')
+def preview_image(file_id):
+    """Raster preview of the current SVG, drawn from the stored wave data
+
+    ?size= sets the longest side in pixels (default 1024).
+    """
+    try:
+        size = int(request.args.get('size', 0)) or None
+    except ValueError:
+        return jsonify({'error': 'Invalid size'}), 400
+    if size is not None and not 1 <= size <= 8192:
+        return jsonify({'error': 'Invalid size'}), 400
+
+    store = open_wave_store(f"uploads/{secure_filename(file_id)}.waves", used_params(file_id))
+    if store is None:
+        return jsonify({'error': 'Wave data not available'}), 404
+    return Response(preview_png(store, size), mimetype='image/png')
+
+def tile_pyramid(file_id):
+    """TilePyramid of the file's current wave data, or None if there is none"""
+    file_id = secure_filename(file_id)
+    store = open_wave_store(f"uploads/{file_id}.waves", used_params(file_id))
+    return TilePyramid(store, f"uploads/{file_id}.tiles") if store is not None else None
+
+@app.route('/tiles/<file_id>/info.json')
+def tile_info(file_id):
+    """Size and zoom levels of the file's tile pyramid, with the URL template of its tiles"""
+    pyramid = tile_pyramid(file_id)
+    if pyramid is None:
+        return jsonify({'error': 'Wave data not available'}), 404
+    info = pyramid.info()
+    info['url'] = f"/tiles/{file_id}/{pyramid.key}/{{z}}/{{x}}/{{y}}.png"
+    return jsonify(info)
+
+@app.route('/tiles/<file_id>/<key>/<int:z>/<int:x>/<int:y>.png')
+def tile_image(file_id, key, z, x, y):
+    """One PNG tile, drawn on first request
+
+    Tile URLs contain the key of the wave data they show, so they can be
+    cached by the browser for as long as it likes.
+    """
+    pyramid = tile_pyramid(file_id)
+    if pyramid is None or pyramid.key != key:
+        return jsonify({'error': 'Wave data not available'}), 404
+    path = pyramid.tile_path(z, x, y)
+    if path is None:
+        return jsonify({'error': 'Tile out of range'}), 404
+    return send_file(path, mimetype='image/png', max_age=365 * 24 * 3600)
+
 @app.route('/config', methods=['GET', 'POST'])
 def handle_config():
     """Get or update configuration"""
+    global default_params
+
     if request.method == 'GET':
-        return jsonify({
-            'line_height': config.LINE_HEIGHT,
-            'amplitude_min': config.AMPLITUDE_MIN,
-            'amplitude_max': config.AMPLITUDE_MAX,
-            'frequency_min': config.FREQUENCY_MIN,
-            'frequency_max': config.FREQUENCY_MAX,
-            'stroke_width_min': config.STROKE_WIDTH_MIN,
-            'stroke_width_max': config.STROKE_WIDTH_MAX
-        })
+        return jsonify(request_params().to_dict())
 
     elif request.method == 'POST':
         data = request.get_json()
 
-        # Update configuration values
-        if 'amplitude_min' in data:
-            config.AMPLITUDE_MIN = float(data['amplitude_min'])
-        if 'amplitude_max' in data:
-            config.AMPLITUDE_MAX = float(data['amplitude_max'])
-        if 'frequency_min' in data:
-            config.FREQUENCY_MIN = float(data['frequency_min'])
-        if 'frequency_max' in data:
-            config.FREQUENCY_MAX = float(data['frequency_max'])
-        if 'stroke_width_min' in data:
-            config.STROKE_WIDTH_MIN = float(data['stroke_width_min'])
-        if 'stroke_width_max' in data:
-            config.STROKE_WIDTH_MAX = float(data['stroke_width_max'])
-        if 'line_height' in data:
-            config.LINE_HEIGHT = int(data['line_height'])
-
-        # Reinitialize processors with new configuration
-        global image_processor, sine_generator, svg_generator
-        image_processor = ImageProcessor(line_height=config.LINE_HEIGHT)
-        sine_generator = SineGenerator(
-            line_height=config.LINE_HEIGHT,
-            frequency_min=config.FREQUENCY_MIN,
-            frequency_max=config.FREQUENCY_MAX,
-            amplitude_min=config.AMPLITUDE_MIN,
-            amplitude_max=config.AMPLITUDE_MAX,
-            width_min=config.STROKE_WIDTH_MIN,
-            width_max=config.STROKE_WIDTH_MAX
-        )
-        svg_generator = SVGGenerator()
+        # Replace the defaults as a whole so running requests keep the
+        # parameters they started with
+        with default_params_lock:
+            try:
+                default_params = default_params.with_overrides(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
 
         return jsonify({'status': 'updated'})
 
-@app.route('/reprocess/<file_id>', methods=['POST'])
-def reprocess_image(file_id):
-    """Reprocess an existing image with current configuration"""
+@app.route('/cache')
+def cache_stats():
+    """Report conversion result cache hits, misses and size"""
+    return jsonify(result_cache.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage latency histograms and conversion counters in the Prometheus text format"""
+    return Response(metrics.render(), content_type=Metrics.CONTENT_TYPE)
+
+@app.route('/batch', methods=['POST'])
+def create_batch():
+    """Queue conversions of many images with one or more parameter sets
+
+    Images come as 'files' form fields and/or a zip 'archive'. The optional
+    'params' field holds a JSON object or list of objects with overrides
+    of the defaults; every image is converted once per object.
+    """
     try:
-        # Find the original image file
-        original_files = [f for f in os.listdir('uploads') if f.startswith(file_id) and not f.endswith('.svg')]
-        if not original_files:
-            return jsonify({'error': 'Original image not found'}), 404
+        overrides = json.loads(request.form.get('params') or '{}')
+        if isinstance(overrides, dict):
+            overrides = [overrides]
+        if not isinstance(overrides, list) or not overrides or not all(isinstance(o, dict) for o in overrides):
+            raise ValueError("params must be an object or a non-empty list of objects")
+        param_sets = [request_params(o) for o in overrides]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        original_path = f"uploads/{original_files[0]}"
+    files = [f for f in request.files.getlist('files') if f.filename and allowed_file(f.filename)]
+    archive = request.files.get('archive')
+    if not files and archive is None:
+        return jsonify({'error': 'No images provided'}), 400
 
-        # Process image with current configuration
-        processed_data = image_processor.process_image(original_path)
+    batch = Batch('uploads', param_sets)
+    try:
+        for file in files:
+            batch.add_image(file.filename, file.stream)
+        if archive is not None:
+            batch.add_archive(archive.stream, allowed_file)
+        if not batch.images:
+            raise ValueError('No images provided')
 
-        # Generate sine waves
-        sine_waves = sine_generator.generate_sine_waves(processed_data)
+        # One job per image runs all parameter sets on the decoded image
+        jobs = [
+            (batch.job_id(index), convert_variants,
+             (batch.image_path(index), batch.outputs(index), batch.stage_dir(index)),
+             record_batch_results)
+            for index in range(len(batch.images))
+        ]
+        job_queue.submit_many(jobs)
+    except (ValueError, zipfile.BadZipFile) as e:
+        shutil.rmtree(batch.directory, ignore_errors=True)
+        return jsonify({'error': str(e)}), 400
+    except QueueFullError as e:
+        shutil.rmtree(batch.directory, ignore_errors=True)
+        return jsonify({'error': str(e)}), 503
 
-        # Generate SVG
-        svg_content = svg_generator.generate_optimized_svg(
-            sine_waves,
-            processed_data['width'],
-            processed_data['height']
-        )
+    with batches_lock:
+        batches[batch.id] = batch
+    prune_runs(batches, batches_lock,
+               lambda batch: all(job_finished(batch.job_id(index)) for index in range(len(batch.images))))
 
-        # Save SVG file
-        svg_path = f"uploads/{file_id}.svg"
-        with open(svg_path, 'w') as f:
-            f.write(svg_content)
+    return jsonify(batch_report(batch)), 202
 
-        return jsonify({
+def record_batch_results(result):
+    for variant in result['results']:
+        if 'cache_hit' in variant:
+            result_cache.record(variant['cache_hit'])
+            metrics.record_conversion(variant)
+
+def batch_report(batch):
+    statuses = [job_queue.status(batch.job_id(index)) for index in range(len(batch.images))]
+    return batch.report(statuses)
+
+@app.route('/batch/<batch_id>')
+def get_batch_status(batch_id):
+    """Get status and per-item timing report of a batch"""
+    with batches_lock:
+        batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify(batch_report(batch))
+
+@app.route('/batch/<batch_id>/download')
+def download_batch(batch_id):
+    """Download the SVGs of a finished batch and its report as a zip"""
+    with batches_lock:
+        batch = batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+
+    report = batch_report(batch)
+    if report['status'] != 'done':
+        return jsonify({'error': 'Batch is still running', 'status': report['status']}), 409
+
+    archive_path = os.path.join(batch.directory, 'batch.zip')
+    if not os.path.exists(archive_path):
+        tmp_path = f"{archive_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            batch.write_zip(f, report)
+        os.replace(tmp_path, archive_path)
+
+    return send_file(archive_path, as_attachment=True, download_name=f"batch-{batch_id}.zip")
+
+@app.route('/sweep', methods=['POST'])
+def create_sweep():
+    """Queue preview conversions of one uploaded image for many parameter sets
+
+    The JSON body names the upload in 'file_id' and holds either a 'grid'
+    of {name: [values]} whose every combination is converted, or a list
+    'params' of override objects. Optional 'base' overrides apply to all
+    sets; 'preview_width' and 'tile_size' override the configured sizes.
+    """
+    data = request.get_json(silent=True) or {}
+    original_path = find_original(str(data.get('file_id', ''))) if data.get('file_id') else None
+    if original_path is None:
+        return jsonify({'error': 'Original image not found'}), 404
+
+    try:
+        if 'grid' in data:
+            overrides = expand_grid(data['grid'])
+        else:
+            overrides = data.get('params')
+            if not isinstance(overrides, list) or not all(isinstance(o, dict) for o in overrides):
+                raise ValueError("Either grid or a list of params objects is required")
+        sweep = Sweep('uploads', data['file_id'], request_params(data.get('base')), overrides,
+                      optional_int(data, 'preview_width'), optional_int(data, 'tile_size'))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        job_queue.submit(sweep.job_id, run_sweep, original_path, sweep.outputs(), sweep.sheet_path,
+                         sweep.labels(), sweep.tile_size)
+    except QueueFullError as e:
+        shutil.rmtree(sweep.directory, ignore_errors=True)
+        return jsonify({'error': str(e)}), 503
+
+    with sweeps_lock:
+        sweeps[sweep.id] = sweep
+    prune_runs(sweeps, sweeps_lock, lambda sweep: job_finished(sweep.job_id))
+
+    return jsonify(sweep.report(job_queue.status(sweep.job_id))), 202
+
+def optional_int(data, name):
+    """Integer value of data[name], or None if it is missing"""
+    if data.get(name) is None:
+        return None
+    try:
+        return int(data[name])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {data[name]!r}")
+
+def get_sweep(sweep_id):
+    with sweeps_lock:
+        return sweeps.get(sweep_id)
+
+@app.route('/sweep/<sweep_id>')
+def get_sweep_status(sweep_id):
+    """Get status and per-variant results of a sweep"""
+    sweep = get_sweep(sweep_id)
+    if sweep is None:
+        return jsonify({'error': 'Sweep not found'}), 404
+    return jsonify(sweep.report(job_queue.status(sweep.job_id)))
+
+@app.route('/sweep/<sweep_id>/sheet.png')
+def sweep_sheet(sweep_id):
+    """Contact sheet of all variants of a finished sweep"""
+    sweep = get_sweep(sweep_id)
+    if sweep is None:
+        return jsonify({'error': 'Sweep not found'}), 404
+    if not os.path.exists(sweep.sheet_path):
+        return jsonify({'error': 'Sweep is still running'}), 409
+    return send_file(sweep.sheet_path, mimetype='image/png')
+
+@app.route('/sweep/<sweep_id>/<int:index>.svg')
+def sweep_svg(sweep_id, index):
+    """SVG of one variant of a sweep"""
+    sweep = get_sweep(sweep_id)
+    if sweep is None or index >= len(sweep.param_sets) or not os.path.exists(sweep.svg_path(index)):
+        return jsonify({'error': 'SVG not found'}), 404
+    return send_file(sweep.svg_path(index), mimetype='image/svg+xml')
+
+@app.route('/reprocess/<file_id>', methods=['POST'])
+def reprocess_image(file_id):
+    """Queue reprocessing of an existing image with current configuration"""
+    timer = StageTimer()
+    try:
+        params = request_params(request.get_json(silent=True))
+        profile = profile_requested()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PermissionError as e:
+        return jsonify({'error': str(e)}), 403
+
+    try:
+        # Find the original image file
+        original_path = find_original(file_id)
+        if original_path is None:
+            return jsonify({'error': 'Original image not found'}), 404
+
+        # Queue the conversion with current configuration
+        with timer.stage('submit'):
+            job = submit_conversion(file_id, original_path, params, profile)
+
+        return timed_response('reprocess', timer, {
             'id': file_id,
-            'svg_file': f'/uploads/{file_id}.svg',
-            'width': processed_data['width'],
-            'height': processed_data['height'],
-            'num_lines': processed_data['num_lines']
-        })
+            'job_id': file_id,
+            'status': job['status'],
+            'params': params.to_dict(),
+            'svg_file': f'/uploads/{file_id}.svg'
+        }, 202)
 
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# A WSGI server importing the app claims the lock at once, so extra worker
+# processes fail to boot; job workers re-import a script run directly as
+# __mp_main__ and must not
+if __name__ not in ('__main__', '__mp_main__'):
+    start_server()
+
 if __name__ == '__main__':
     # Create uploads directory if it doesn't exist
     os.makedirs('uploads', exist_ok=True)
+
+    # With the reloader, requests are served by a child of this process
+    if is_running_from_reloader():
+        start_server()
     
     # Run the application
-    app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
+    app.run(debug=True, host='0.0.0.0', port=5002, threaded=True)
\ No newline at end of file
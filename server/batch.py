@@ -0,0 +1,120 @@
+import os
+import json
+import uuid
+import shutil
+import zipfile
+import logging
+from werkzeug.utils import secure_filename
+from config.config import BATCH_ARCHIVE_MAX_ENTRIES, BATCH_ARCHIVE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+class Batch:
+    """A set of images converted with one or more parameter sets
+
+    Images are stored in a directory of their own. Each image becomes one
+    job that runs every parameter set on it, so the decoded image is shared
+    between the sets while different images spread across the workers.
+    """
+
+    def __init__(self, upload_dir, param_sets):
+        self.id = str(uuid.uuid4())
+        self.directory = os.path.join(upload_dir, f"batch-{self.id}")
+        self.param_sets = param_sets
+        self.images = []
+        os.makedirs(self.directory, exist_ok=True)
+
+    def add_image(self, filename, stream):
+        """Save an image from a binary stream under a unique name"""
+        name = f"{len(self.images)}-{secure_filename(os.path.basename(filename))}"
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        self.images.append(name)
+
+    def add_archive(self, stream, allowed_file):
+        """Save every image in a zip archive whose name passes allowed_file
+
+        Raises:
+            ValueError: if the archive has more than BATCH_ARCHIVE_MAX_ENTRIES
+            entries or its images would take more than BATCH_ARCHIVE_MAX_BYTES
+        """
+        with zipfile.ZipFile(stream) as archive:
+            members = archive.infolist()
+            if len(members) > BATCH_ARCHIVE_MAX_ENTRIES:
+                raise ValueError(f"Archive has {len(members)} entries; the limit is {BATCH_ARCHIVE_MAX_ENTRIES}")
+            # Reading stops at each entry's declared size, so checking those bounds what is written
+            members = [member for member in members if not member.is_dir() and allowed_file(member.filename)]
+            total_size = sum(member.file_size for member in members)
+            if total_size > BATCH_ARCHIVE_MAX_BYTES:
+                raise ValueError(f"Archive images take {total_size} bytes uncompressed; "
+                                 f"the limit is {BATCH_ARCHIVE_MAX_BYTES}")
+            for member in members:
+                with archive.open(member) as image:
+                    self.add_image(member.filename, image)
+
+    def job_id(self, index):
+        return f"{self.id}:{index}"
+
+    def image_path(self, index):
+        return os.path.join(self.directory, self.images[index])
+
+    def svg_name(self, index, set_index):
+        stem = self.images[index].rsplit('.', 1)[0]
+        return f"{stem}_p{set_index}.svg"
+
+    def outputs(self, index):
+        """(svg_path, params) for every parameter set of an image"""
+        return [(os.path.join(self.directory, self.svg_name(index, set_index)), params)
+                for set_index, params in enumerate(self.param_sets)]
+
+    def stage_dir(self, index):
+        return os.path.join(self.directory, f"{index}.stages")
+
+    def report(self, statuses):
+        """Per-image, per-parameter-set results and timings
+
+        Args:
+            statuses: JobQueue status of each image's job, in image order
+        """
+        items = []
+        for index, status in enumerate(statuses):
+            status = status or {'status': 'unknown'}
+            results = status.get('results') or [{} for _ in self.param_sets]
+            variants = []
+            for set_index, result in enumerate(results):
+                variant = {'params': set_index, 'svg': self.svg_name(index, set_index)}
+                variant.update(result)
+                variants.append(variant)
+            items.append({
+                'image': self.images[index],
+                'status': status['status'],
+                'timings': status.get('timings'),
+                'error': status.get('error'),
+                'variants': variants
+            })
+
+        states = [item['status'] for item in items]
+        if all(state in ('done', 'failed') for state in states):
+            state = 'done'
+        elif any(state in ('running', 'done', 'failed') for state in states):
+            state = 'running'
+        else:
+            state = 'queued'
+
+        return {
+            'id': self.id,
+            'status': state,
+            'params': [params.to_dict() for params in self.param_sets],
+            'items': items
+        }
+
+    def write_zip(self, out, report):
+        """Write the finished SVGs and the report as a zip archive to out"""
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for item in report['items']:
+                for variant in item['variants']:
+                    svg_path = os.path.join(self.directory, variant['svg'])
+                    if 'error' not in variant and os.path.exists(svg_path):
+                        archive.write(svg_path, variant['svg'])
+            archive.writestr('report.json', json.dumps(report, indent=2))
+        logger.debug(f"Wrote archive of batch {self.id}")
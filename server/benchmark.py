@@ -0,0 +1,177 @@
+"""Benchmark the conversion stages over the bundled and synthetic test images
+
+Times load_image, calculate_line_intensities, generate_sine_waves and
+generate_optimized_svg separately for every image and line height, records
+each stage's peak traced memory and the SVG size, and compares them with a
+stored baseline.
+
+Examples:
+    python benchmark.py --save-baseline
+    python benchmark.py --synthetic 4000x4000 8000x8000 --line-heights 4 8
+    python benchmark.py --threshold 0.1    # exit status 1 on regressions
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from create_test_image import create_synthetic_images, parse_size
+from image_processor import ImageProcessor
+from sine_generator import SineGenerator
+from svg_generator import SVGGenerator
+
+DEFAULT_IMAGES = ['face.png', 'horizontal_gradient_4000.png', 'val-4000px.jpg',
+                  'stripe-38px.png', 'stripe-400px.png', 'stripe-425x16px.png', 'stripe-70x8px.png']
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+STAGES = ('load_image', 'calculate_line_intensities', 'generate_sine_waves', 'generate_optimized_svg')
+STAGE_LABELS = ('load', 'intensities', 'waves', 'svg')
+
+# Differences below these are noise, whatever the relative change
+MIN_SECONDS_DELTA = 0.005
+MIN_BYTES_DELTA = 1024 * 1024
+
+def run_stages(image_path, line_height, trace_memory=False):
+    """Run the pipeline stages once; returns per-stage seconds, peak bytes and the SVG size"""
+    image_processor = ImageProcessor(line_height=line_height)
+    sine_generator = SineGenerator(line_height=line_height)
+    svg_generator = SVGGenerator()
+    state = {}
+
+    def load_image():
+        state['image_array'] = image_processor.load_image(image_path)
+
+    def calculate_line_intensities():
+        state['processed'] = image_processor.process_array(state['image_array'])
+
+    def generate_sine_waves():
+        state['sine_waves'] = sine_generator.generate_sine_waves(state['processed'])
+
+    def generate_optimized_svg():
+        processed = state['processed']
+        state['svg'] = svg_generator.generate_optimized_svg(state['sine_waves'], processed.width, processed.height)
+
+    seconds, peaks = {}, {}
+    for name, stage in zip(STAGES, (load_image, calculate_line_intensities, generate_sine_waves, generate_optimized_svg)):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        stage()
+        seconds[name] = time.perf_counter() - start
+        if trace_memory:
+            peaks[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return seconds, peaks, len(state['svg'].encode())
+
+def benchmark_case(image_path, line_height, repeat):
+    """Best-of-repeat stage timings, plus peak memory from a separate traced run"""
+    best = {}
+    for _ in range(repeat):
+        seconds, _, output_bytes = run_stages(image_path, line_height)
+        for name, value in seconds.items():
+            best[name] = min(best.get(name, value), value)
+
+    # Tracing slows allocation-heavy stages down, so it gets a run of its own
+    _, peaks, _ = run_stages(image_path, line_height, trace_memory=True)
+
+    return {
+        'stages': {name: {'seconds': round(best[name], 4), 'peak_bytes': peaks[name]} for name in STAGES},
+        'total_seconds': round(sum(best.values()), 4),
+        'output_bytes': output_bytes
+    }
+
+def compare(results, baseline, threshold):
+    """List of regressions of results against baseline, as readable strings"""
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        for name in STAGES:
+            now, before = result['stages'][name], previous['stages'].get(name)
+            if before is None:
+                continue
+            if (now['seconds'] > before['seconds'] * (1 + threshold)
+                    and now['seconds'] - before['seconds'] > MIN_SECONDS_DELTA):
+                regressions.append(f"{case} {name}: {before['seconds']:.4f}s -> {now['seconds']:.4f}s")
+            if (now['peak_bytes'] > before['peak_bytes'] * (1 + threshold)
+                    and now['peak_bytes'] - before['peak_bytes'] > MIN_BYTES_DELTA):
+                regressions.append(f"{case} {name}: peak {before['peak_bytes']} -> {now['peak_bytes']} bytes")
+    return regressions
+
+def print_table(results, baseline):
+    header = f"{'case':<40}" + "".join(f"{label:>22}" for label in STAGE_LABELS) + f"{'svg bytes':>12}"
+    print(header)
+    for case, result in results.items():
+        previous = baseline.get(case, {}).get('stages', {})
+        cells = []
+        for name in STAGES:
+            seconds = result['stages'][name]['seconds']
+            cell = f"{seconds * 1000:.1f}ms"
+            if name in previous and previous[name]['seconds'] > 0:
+                cell += f" ({seconds / previous[name]['seconds']:.2f}x)"
+            cells.append(f"{cell:>22}")
+        print(f"{case:<40}" + "".join(cells) + f"{result['output_bytes']:>12}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ImageWave conversion stages.")
+    parser.add_argument('--images', nargs='+', default=DEFAULT_IMAGES, help="bundled images to run (default: %(default)s)")
+    parser.add_argument('--synthetic', type=parse_size, nargs='*', default=[], metavar='WxH',
+                        help="also run synthetic plates of these sizes")
+    parser.add_argument('--line-heights', type=int, nargs='+', default=[4, 8], help="line heights to run (default: 4 8)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case; the best is kept (default: 3)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline file (default: benchmark_baseline.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="relative slowdown or memory growth counted as a regression (default: 0.2)")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as synthetic_dir:
+        image_paths = [os.path.join(REPO_DIR, name) for name in args.images]
+        image_paths += create_synthetic_images(args.synthetic, synthetic_dir)
+
+        results = {}
+        for image_path in image_paths:
+            for line_height in args.line_heights:
+                case = f"{os.path.basename(image_path)}@lh{line_height}"
+                results[case] = benchmark_case(image_path, line_height, args.repeat)
+
+    print_table(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not baseline:
+        print("No baseline to compare with; run with --save-baseline first")
+        return 0
+
+    for case, result in results.items():
+        if case in baseline and result['output_bytes'] != baseline[case]['output_bytes']:
+            print(f"Note: {case} output changed from {baseline[case]['output_bytes']} to {result['output_bytes']} bytes")
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,244 @@
+import math
+import logging
+import numpy as np
+from path_formatter import round_fixed
+from sine_generator import FLAT_FREQUENCY_THRESHOLD
+from config.config import BEZIER_TOLERANCE
+
+logger = logging.getLogger(__name__)
+
+# Share of the tolerance left to rounding coordinates for output
+ROUNDING_SHARE = 0.1
+
+# Share of the tolerance left to the error growing between two checks
+SPACING_SHARE = 0.1
+
+# Bounds on the number of evenly spaced check intervals per segment
+MIN_CHECK_INTERVALS = 4
+MAX_CHECK_INTERVALS = 1024
+
+# Newton steps moving the checks onto the source samples of rounded curves
+NEWTON_STEPS = 2
+
+class BezierFitter:
+    """Fits cubic Bézier segments to a generated sine wave line
+
+    The wave is modelled analytically from the per-sample phase, amplitude and
+    frequency produced by SineGenerator, so the fit never samples every pixel.
+    Segments start between consecutive wave crests (half a period each) and
+    are split in half until the curve stays within tolerance of the wave.
+
+    The error is measured vertically on the curve as it is written, with
+    its points rounded to `decimals` places, which are chosen so that the
+    rounding uses at most ROUNDING_SHARE of the tolerance on level parts
+    of the wave. It is checked at each source sample, where the modelled
+    wave bends sharply, and at points spaced so closely that it cannot
+    grow by more than SPACING_SHARE of the tolerance between them; that
+    growth is added to the measured error before a segment is accepted.
+    """
+
+    def __init__(self, tolerance=None, max_depth=16):
+        self.tolerance = tolerance if tolerance is not None else BEZIER_TOLERANCE
+        if not self.tolerance > 0:
+            raise ValueError(f"Invalid Bézier tolerance: {self.tolerance}")
+        self.max_depth = max_depth
+        # Rounding to d places moves a point by up to 0.5 * 10**-d per axis
+        self.decimals = max(1, math.ceil(math.log10(0.5 / (ROUNDING_SHARE * self.tolerance))))
+
+    def fit(self, wave_data, start=0, end=None):
+        """Fit cubic Bézier segments to samples start..end (inclusive) of a line
+
+        Args:
+            wave_data: wave dict with 'x_coords', 'phase', 'amplitudes',
+                       'frequencies' and 'base_y'
+            start, end: sample index range to fit
+
+        Returns:
+            start_point: (x, y) of the first point
+            controls: (num_segments, 6) array of c1x, c1y, c2x, c2y, x, y
+        """
+        model = _WaveModel(wave_data, start, end)
+
+        knots = model.crest_positions()
+        # Only the halves of segments split in the last round need checking
+        seg_start, seg_end = knots[:-1], knots[1:]
+        for _ in range(self.max_depth):
+            too_far = self._segment_error(model, seg_start, seg_end) > self.tolerance
+            if not np.any(too_far):
+                break
+            seg_start, seg_end = seg_start[too_far], seg_end[too_far]
+            midpoints = (seg_start + seg_end) / 2
+            knots = np.sort(np.concatenate([knots, midpoints]))
+            order = np.argsort(np.concatenate([seg_start, midpoints]))
+            seg_start = np.concatenate([seg_start, midpoints])[order]
+            seg_end = np.concatenate([midpoints, seg_end])[order]
+        else:
+            logger.debug(f"Bézier fit reached max depth {self.max_depth} before the tolerance")
+
+        y, slope = model.evaluate(knots)
+        return (knots[0], y[0]), _controls(knots[:-1], knots[1:], y[:-1], slope[:-1], y[1:], slope[1:])
+
+    def _segment_error(self, model, seg_start, seg_end):
+        """Bound of the vertical deviation between each segment's rounded curve and the wave
+
+        Segments are sorted and do not overlap, but need not be contiguous.
+        """
+        y0, slope0 = model.evaluate(seg_start)
+        y1, slope1 = model.evaluate(seg_end)
+        start_points = round_fixed(np.column_stack([seg_start, y0]), self.decimals) / 10 ** self.decimals
+        controls = _controls(seg_start, seg_end, y0, slope0, y1, slope1)
+        controls = round_fixed(controls, self.decimals) / 10 ** self.decimals
+        y_points = np.column_stack([start_points[:, 1], controls[:, 1:6:2]])
+
+        # Between two checks the error can grow by at most its curvature
+        # times the squared spacing over 8
+        h = seg_end - seg_start
+        curvature = model.max_curvature(seg_start, seg_end) + _curvature(y_points, h)
+        spacing = np.sqrt(8 * SPACING_SHARE * self.tolerance / np.maximum(curvature, 1e-12))
+        intervals = np.clip(np.ceil(h / spacing), MIN_CHECK_INTERVALS, MAX_CHECK_INTERVALS).astype(np.intp)
+        growth = curvature * (h / intervals) ** 2 / 8
+
+        # Evenly spaced checks, endpoints included
+        counts = intervals + 1
+        segment = np.repeat(np.arange(len(h)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = within / (counts[segment] - 1)
+
+        # Checks at the source samples inside segments; rounding bends the
+        # curve's x slightly, so t is refined to land on them
+        sample_segment = np.searchsorted(seg_start, model.x, side='right') - 1
+        inside = sample_segment >= 0
+        inside[inside] = model.x[inside] < seg_end[sample_segment[inside]]
+        inside &= ~np.isin(model.x, seg_start)
+        sample_x = model.x[inside]
+        sample_segment = sample_segment[inside]
+        sample_t = (sample_x - seg_start[sample_segment]) / h[sample_segment]
+        x_points = np.column_stack([start_points[sample_segment, 0], controls[sample_segment, 0:5:2]])
+        for _ in range(NEWTON_STEPS):
+            x, dx = _bezier(x_points, sample_t)
+            sample_t = np.clip(sample_t - (x - sample_x) / np.where(dx > 0, dx, 1), 0, 1)
+        segment = np.concatenate([segment, sample_segment])
+        t = np.concatenate([t, sample_t])
+
+        # Points on the Bézier curves at t, compared with the wave at their x
+        curve_x, _ = _bezier(np.column_stack([start_points[segment, 0], controls[segment, 0:5:2]]), t)
+        curve_y, _ = _bezier(y_points[segment], t)
+        wave_y, _ = model.evaluate(curve_x)
+
+        error = np.zeros(len(h))
+        np.maximum.at(error, segment, np.abs(curve_y - wave_y))
+        return error + growth
+
+
+def _controls(starts, ends, y0, slope0, y1, slope1):
+    """Control and end points of cubic Béziers between x positions, matching the wave's height and slope at both"""
+    h = ends - starts
+    controls = np.empty((len(h), 6))
+    controls[:, 0] = starts + h / 3
+    controls[:, 1] = y0 + slope0 * h / 3
+    controls[:, 2] = ends - h / 3
+    controls[:, 3] = y1 - slope1 * h / 3
+    controls[:, 4] = ends
+    controls[:, 5] = y1
+    return controls
+
+
+def _bezier(points, t):
+    """Value and derivative at t of one-dimensional cubic Béziers with (n, 4) control values"""
+    p0, p1, p2, p3 = points.T
+    u = 1 - t
+    value = u ** 3 * p0 + 3 * u ** 2 * t * p1 + 3 * u * t ** 2 * p2 + t ** 3 * p3
+    derivative = 3 * (u ** 2 * (p1 - p0) + 2 * u * t * (p2 - p1) + t ** 2 * (p3 - p2))
+    return value, derivative
+
+
+def _curvature(points, h):
+    """Largest |d²y/dx²| along cubic Béziers with (n, 4) y control values spanning widths h"""
+    p0, p1, p2, p3 = points.T
+    # The second derivative is linear in t, and x is close to linear with slope h
+    return 6 * np.maximum(np.abs(p2 - 2 * p1 + p0), np.abs(p3 - 2 * p2 + p1)) / h ** 2
+
+
+class _WaveModel:
+    """Continuous wave through one line's samples: y = base + A(x) sin(phase(x))
+
+    Phase and amplitude are interpolated linearly between samples, and
+    samples drawn flat by SineGenerator get zero amplitude.
+    """
+
+    def __init__(self, wave_data, start, end):
+        end = len(wave_data['x_coords']) - 1 if end is None else end
+        span = slice(start, end + 1)
+
+        self.x = np.asarray(wave_data['x_coords'][span], dtype=np.float64)
+        self.phase = np.asarray(wave_data['phase'][span], dtype=np.float64)
+        self.base_y = wave_data['base_y']
+
+        amplitudes = np.asarray(wave_data['amplitudes'][span], dtype=np.float64)
+        flat = np.asarray(wave_data['frequencies'][span]) <= FLAT_FREQUENCY_THRESHOLD
+        self.amplitudes = np.where(flat, 0.0, amplitudes)
+
+    def crest_positions(self):
+        """x positions of the line ends and every crest or trough in between"""
+        if len(self.x) < 2:
+            return self.x.copy()
+
+        # Index of the last crest/trough (phase = pi/2 + k*pi) at or before each sample
+        crest_index = np.floor((self.phase - np.pi / 2) / np.pi)
+        lo = np.minimum(crest_index[:-1], crest_index[1:])
+        hi = np.maximum(crest_index[:-1], crest_index[1:])
+        counts = (hi - lo).astype(np.intp)
+
+        interval = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        target_phase = np.pi / 2 + (lo[interval] + 1 + offsets) * np.pi
+
+        phase0 = self.phase[interval]
+        phase1 = self.phase[interval + 1]
+        t = (target_phase - phase0) / (phase1 - phase0)
+        crests = self.x[interval] + t * (self.x[interval + 1] - self.x[interval])
+
+        knots = np.unique(np.concatenate([[self.x[0]], crests, [self.x[-1]]]))
+        # Drop crests that would make degenerate segments at the line ends
+        keep = np.concatenate([[True], np.diff(knots) > 1e-6])
+        knots = knots[keep]
+        knots[-1] = self.x[-1]
+        return knots
+
+    def evaluate(self, positions):
+        """Wave height and slope dy/dx at arbitrary x positions"""
+        positions = np.asarray(positions, dtype=np.float64)
+        if len(self.x) < 2:
+            return np.full(positions.shape, self.base_y + 0.0), np.zeros(positions.shape)
+
+        interval = np.clip(np.searchsorted(self.x, positions, side='right') - 1, 0, len(self.x) - 2)
+        dx = self.x[interval + 1] - self.x[interval]
+        t = (positions - self.x[interval]) / dx
+
+        phase_step = self.phase[interval + 1] - self.phase[interval]
+        amplitude_step = self.amplitudes[interval + 1] - self.amplitudes[interval]
+        phase = self.phase[interval] + t * phase_step
+        amplitude = self.amplitudes[interval] + t * amplitude_step
+
+        y = self.base_y + amplitude * np.sin(phase)
+        slope = (amplitude_step * np.sin(phase) + amplitude * phase_step * np.cos(phase)) / dx
+        return y, slope
+
+    def max_curvature(self, starts, ends):
+        """Upper bound of |d²y/dx²| of the wave between each pair of positions"""
+        starts = np.asarray(starts, dtype=np.float64)
+        if len(self.x) < 2:
+            return np.zeros(starts.shape)
+
+        # Within a sample interval, y'' = 2 A' phase' cos(phase) - A phase'^2 sin(phase)
+        dx = np.diff(self.x)
+        phase_rate = np.diff(self.phase) / dx
+        amplitude_rate = np.diff(self.amplitudes) / dx
+        amplitude = np.maximum(self.amplitudes[:-1], self.amplitudes[1:])
+        curvature = amplitude * phase_rate ** 2 + 2 * np.abs(amplitude_rate * phase_rate)
+
+        first = np.clip(np.searchsorted(self.x, starts, side='right') - 1, 0, len(dx) - 1)
+        last = np.clip(np.searchsorted(self.x, ends, side='left') - 1, first, len(dx) - 1)
+        # Every even reduceat slice is one segment's intervals first..last
+        bounds = np.column_stack([first, last + 1]).ravel()
+        return np.maximum.reduceat(np.append(curvature, 0.0), bounds)[::2]
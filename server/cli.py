@@ -0,0 +1,156 @@
+"""Convert images to ImageWave SVGs from the command line
+
+Examples:
+    python cli.py photo.jpg
+    python cli.py "plates/*.png" --jobs 8 --output-dir out --line-height 6
+    python cli.py photo.jpg --stdout --path-mode bezier > photo.svg
+
+Only the modules needed for the checks are imported up front; numpy, Pillow
+and the generators are loaded once a file actually has to be converted, so
+runs where every output is up to date start quickly.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from dataclasses import fields
+from params import ConversionParams, PATH_MODES
+
+def build_parser(defaults):
+    parser = argparse.ArgumentParser(description="Convert images to sine wave SVGs.")
+    parser.add_argument('inputs', nargs='+', help="image files or glob patterns")
+    parser.add_argument('-o', '--output-dir', help="directory for the SVGs (default: next to each image)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of images converted in parallel (default: 1)")
+    parser.add_argument('--stdout', action='store_true', help="write the SVG of a single image to standard output")
+    parser.add_argument('-f', '--force', action='store_true', help="convert even if the SVG is up to date")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only report errors")
+
+    # One flag per conversion parameter, defaulting to config/config.py
+    group = parser.add_argument_group('conversion parameters')
+    for field in fields(ConversionParams):
+        flag = '--' + field.name.replace('_', '-')
+        default = getattr(defaults, field.name)
+        if field.name == 'path_mode':
+            group.add_argument(flag, choices=PATH_MODES, help=f"(default: {default})")
+        else:
+            group.add_argument(flag, type=field.type, metavar=field.name.upper(), help=f"(default: {default})")
+    return parser
+
+def expand_inputs(patterns):
+    """Image paths for a list of file names and glob patterns, in order and without duplicates"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def output_paths(image_path, output_dir):
+    """SVG path for an image and the path of the record of its parameters next to it"""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    directory = output_dir or os.path.dirname(image_path)
+    svg_path = os.path.join(directory, f"{stem}.svg")
+    return svg_path, f"{svg_path}.json"
+
+def is_up_to_date(image_path, svg_path, params_path, params):
+    """True if the SVG is newer than the image and was made with the same parameters"""
+    try:
+        if os.path.getmtime(svg_path) < os.path.getmtime(image_path):
+            return False
+        with open(params_path) as f:
+            return json.load(f) == params.to_dict()
+    except (OSError, ValueError):
+        return False
+
+def convert_file(image_path, svg_path, params_path, params):
+    """Convert one image and record the parameters used; runs in worker processes"""
+    from pipeline import convert_image
+
+    start = time.perf_counter()
+    result = convert_image(image_path, svg_path, params, use_cache=False)
+    with open(params_path, 'w') as f:
+        json.dump(params.to_dict(), f)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def main(argv=None):
+    defaults = ConversionParams.from_config()
+    parser = build_parser(defaults)
+    args = parser.parse_args(argv)
+
+    overrides = {field.name: getattr(args, field.name) for field in fields(ConversionParams)
+                 if getattr(args, field.name) is not None}
+    try:
+        params = defaults.with_overrides(overrides)
+    except ValueError as e:
+        parser.error(str(e))
+
+    image_paths = expand_inputs(args.inputs)
+    missing = [path for path in image_paths if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"no such file: {missing[0]}")
+    if not image_paths:
+        parser.error("no images match the given patterns")
+
+    if args.stdout:
+        if len(image_paths) != 1:
+            parser.error("--stdout takes exactly one image")
+        from pipeline import convert_image
+        convert_image(image_paths[0], sys.stdout, params, use_cache=False)
+        return 0
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    # Images with the same stem, such as photo.png and photo.jpg, would overwrite each other
+    sources = {}
+    for image_path in image_paths:
+        svg_path = os.path.abspath(output_paths(image_path, args.output_dir)[0])
+        if svg_path in sources:
+            parser.error(f"{sources[svg_path]} and {image_path} would both be written to {svg_path}")
+        sources[svg_path] = image_path
+
+    tasks = []
+    for image_path in image_paths:
+        svg_path, params_path = output_paths(image_path, args.output_dir)
+        if not args.force and is_up_to_date(image_path, svg_path, params_path, params):
+            if not args.quiet:
+                print(f"up to date: {svg_path}", file=sys.stderr)
+            continue
+        tasks.append((image_path, svg_path, params_path, params))
+
+    failures = 0
+    for (image_path, svg_path, _, _), outcome in _run_tasks(tasks, args.jobs):
+        if isinstance(outcome, Exception):
+            failures += 1
+            print(f"failed: {image_path}: {outcome}", file=sys.stderr)
+        elif not args.quiet:
+            print(f"converted: {image_path} -> {svg_path} ({outcome['num_lines']} lines, "
+                  f"{outcome['seconds']:.2f}s)", file=sys.stderr)
+
+    return 1 if failures else 0
+
+def _run_tasks(tasks, jobs):
+    """Yield (task, result or exception) for every task, using up to jobs processes"""
+    if jobs <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            try:
+                yield task, convert_file(*task)
+            except Exception as e:
+                yield task, e
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        futures = [(task, executor.submit(convert_file, *task)) for task in tasks]
+        for task, future in futures:
+            try:
+                yield task, future.result()
+            except Exception as e:
+                yield task, e
+
+if __name__ == '__main__':
+    sys.exit(main())
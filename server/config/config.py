@@ -1,8 +1,11 @@
 # ImageWave Configuration Parameters
+import os
 
 # Image Processing Parameters
 LINE_HEIGHT = 4  # Height of each horizontal line in pixels (default: 16)
 AMPLITUDE = 2.0   # Base amplitude of the sine waves (default: 2.0)
+TARGET_WIDTH = 0  # Downscale images to at most this width in pixels while decoding; 0 keeps full size (default: 0)
+TARGET_LINES = 0  # Downscale images to at most this many lines while decoding; 0 keeps full size (default: 0)
 
 # Amplitude and Frequency Mapping
 AMPLITUDE_MIN = 0.1   # Minimum amplitude factor (for intensity 255)
@@ -14,9 +17,45 @@ FREQUENCY_MAX = 1.0   # Maximum frequency (for intensity 0)
 STROKE_WIDTH_MIN = 1.0   # Minimum stroke width (for high intensity/bright areas)
 STROKE_WIDTH_MAX = 1.0   # Maximum stroke width (for low intensity/dark areas)
 
+# Tone Curve
+TONE_CURVE = "linear"   # Curve applied to intensities before mapping: "linear", "gamma:<g>", "scurve:<k>" or "piecewise:<in>/<out>,..." (default: "linear")
+
 # SVG Generation Parameters
 SVG_STROKE_COLOR = "black"  # SVG stroke color (default: "black")
 SVG_FILL = "none"       # SVG fill (default: "none")
+SVG_PATH_MODE = "polyline"  # Path geometry: "polyline" (one point per pixel), "bezier" or "outline" (filled shape per line) (default: "polyline")
+BEZIER_TOLERANCE = 0.1      # Max deviation in pixels of Bezier curves from the wave (default: 0.1)
+SVGZ_COMPRESSLEVEL = 1      # gzip level of the .svgz copies served to browsers; higher levels cost several times more for a few percent (default: 1)
+
+# Background Conversion Jobs
+JOB_WORKERS = 2        # Number of worker processes running conversions (default: 2)
+JOB_QUEUE_LIMIT = 32   # Max queued + running conversions before uploads are refused; a batch counts as one (default: 32)
+LINE_WORKERS = 1       # Worker processes rendering the lines of one conversion; 1 renders in-process (default: 1)
+
+# Batches
+BATCH_ARCHIVE_MAX_ENTRIES = 1000               # Max entries in a zip archive uploaded to /batch (default: 1000)
+BATCH_ARCHIVE_MAX_BYTES = 1024 * 1024 * 1024   # Max total uncompressed size of the images in a batch archive (default: 1GB)
+
+# Parameter Sweeps
+SWEEP_PREVIEW_WIDTH = 400   # Sweeps convert the image downscaled to this width; 0 uses the full size (default: 400)
+SWEEP_TILE_SIZE = 256       # Longest side of each variant on the contact sheet in pixels (default: 256)
+SWEEP_MAX_VARIANTS = 64     # Max parameter sets in one sweep (default: 64)
+SWEEP_WORKERS = max(1, (os.cpu_count() or 1) // JOB_WORKERS)   # Worker processes rendering the variants of one sweep, kept by each job worker between sweeps; 1 renders in-process (default: CPUs / JOB_WORKERS)
+
+# Tiled Viewer
+TILE_SIZE = 256          # Side of the viewer's PNG tiles in pixels (default: 256)
+TILE_SUPERSAMPLING = 4   # Tiles are drawn this many times larger and scaled down to anti-alias strokes (default: 4)
+TILE_OVERZOOM = 2        # Zoom levels beyond the SVG's own scale, each doubling it (default: 2)
+
+# Large Images
+STREAMING_MIN_PIXELS = 4000 * 4000   # Images with at least this many pixels are converted line by line (default: 4000x4000)
+
+# Conversion Result Cache
+CACHE_DIR = "cache"                    # Directory for cached SVG results (default: "cache")
+CACHE_MAX_BYTES = 512 * 1024 * 1024    # Cache size cap before LRU eviction (default: 512MB)
+
+# Profiling
+PROFILING_ENABLED = os.environ.get('IMAGEWAVE_PROFILING') == '1'  # Allow ?profile=1 on /upload and /reprocess; set IMAGEWAVE_PROFILING=1 (default: off)
 
 # Debug Settings
 DEBUG_LOGGING = False   # Enable debug logging (default: False)
@@ -1,45 +1,36 @@
 import logging
-import numpy as np
+from tone_curve import IntensityLUT
 from config.config import FREQUENCY_MIN, FREQUENCY_MAX
 
 logger = logging.getLogger(__name__)
 
 class FrequencyMapper:
-    def __init__(self, min_frequency=None, max_frequency=None):
+    def __init__(self, min_frequency=None, max_frequency=None, curve=None):
         self.min_frequency = min_frequency if min_frequency is not None else FREQUENCY_MIN
         self.max_frequency = max_frequency if max_frequency is not None else FREQUENCY_MAX
         self.frequency_range = self.max_frequency - self.min_frequency
+        self.lut = IntensityLUT(self._map, curve)
 
         logger.debug(f"FrequencyMapper initialized with range: {self.min_frequency} - {self.max_frequency}")
+
+    def _map(self, normalized_intensities):
+        # Linear interpolation: higher intensity (brighter) = lower frequency
+        # intensity 0 (black) -> FREQUENCY_MAX
+        # intensity 255 (white) -> FREQUENCY_MIN
+        return self.max_frequency - (normalized_intensities * self.frequency_range)
     
     def get_frequency(self, intensity):
-        """Convert pixel intensity (0-255) to sine wave frequency using linear interpolation
+        """Convert pixel intensity (0-255) to sine wave frequency through the lookup table
         
         Args:
             intensity: Pixel intensity (0-255)
             
         Returns:
-            frequency: Linear interpolation between FREQUENCY_MAX (intensity 0) 
-                      and FREQUENCY_MIN (intensity 255)
+            frequency: Interpolation between FREQUENCY_MAX (intensity 0) 
+                      and FREQUENCY_MIN (intensity 255), after the tone curve
         """
-        # Clamp intensity to valid range
-        intensity = max(0, min(255, intensity))
-        
-        # Linear interpolation: higher intensity (brighter) = lower frequency
-        # intensity 0 (black) -> FREQUENCY_MAX
-        # intensity 255 (white) -> FREQUENCY_MIN
-        normalized_intensity = intensity / 255.0
-        frequency = self.max_frequency - (normalized_intensity * self.frequency_range)
-        
-        return frequency
+        return self.lut(intensity)
     
     def get_frequencies_batch(self, intensities):
-        """Convert multiple intensities to frequencies efficiently"""
-        # Clamp intensities to valid range
-        intensities = np.clip(intensities, 0, 255)
-        
-        # Linear interpolation for batch processing
-        normalized_intensities = intensities / 255.0
-        frequencies = self.max_frequency - (normalized_intensities * self.frequency_range)
-        
-        return frequencies
\ No newline at end of file
+        """Convert multiple intensities to frequencies with one table lookup"""
+        return self.lut(intensities)
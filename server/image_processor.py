@@ -1,31 +1,174 @@
 from PIL import Image
 import numpy as np
 import logging
-from config.config import LINE_HEIGHT, DEBUG_LOGGING
+from config.config import LINE_HEIGHT, TARGET_WIDTH, TARGET_LINES, DEBUG_LOGGING
 
 # Configure logging
 log_level = logging.DEBUG if DEBUG_LOGGING else logging.INFO
 logging.basicConfig(level=log_level)
 logger = logging.getLogger(__name__)
 
+INTENSITY_MODES = ('vectorized', 'reference')
+
+# Column sums of up to this many rows are whole numbers below 2**24, which
+# float32 holds exactly
+FLOAT32_MAX_ROWS = 2**24 // 255
+
+class ProcessedImage:
+    """Column intensities of every line of an image, from ImageProcessor.process_array()
+
+    Instead of the image and per-line lists, this holds one contiguous
+    (num_lines x width) matrix of each line's column sums and the uint8
+    pixels of each line's middle row, which stroke widths are sampled from.
+    The sums are whole numbers, so float32 stores them exactly, and the
+    column means derived from them in float64 are the same as the mean of
+    the pixels.
+    """
+    __slots__ = ('column_sums', 'line_rows', 'middle_rows', 'width', 'height')
+
+    def __init__(self, column_sums, line_rows, middle_rows, width, height):
+        line_rows = np.asarray(line_rows, dtype=np.float64)
+        dtype = np.float32 if line_rows.max(initial=0) <= FLOAT32_MAX_ROWS else np.float64
+        self.column_sums = np.ascontiguousarray(column_sums, dtype=dtype)
+        self.line_rows = line_rows
+        self.middle_rows = np.ascontiguousarray(middle_rows, dtype=np.uint8)
+        self.width = width
+        self.height = height
+
+    @property
+    def num_lines(self):
+        return len(self.line_rows)
+
+    @property
+    def nbytes(self):
+        return self.column_sums.nbytes + self.line_rows.nbytes + self.middle_rows.nbytes
+
+    @property
+    def intensities(self):
+        """float64 (num_lines x width) matrix of column means"""
+        return self.column_sums / self.line_rows[:, np.newaxis]
+
+    def intensities_at(self, columns):
+        """Column means of every line at the given column indices, as float64"""
+        return self.column_sums[:, columns] / self.line_rows[:, np.newaxis]
+
+    def line_intensities(self, line_idx):
+        """Column means of one line, as float64"""
+        # A float64 scalar alone would not promote float32 sums
+        return np.divide(self.column_sums[line_idx], self.line_rows[line_idx], dtype=np.float64)
+
 class ImageProcessor:
-    def __init__(self, line_height=None):
+    def __init__(self, line_height=None, intensity_mode='vectorized', target_width=None, target_lines=None):
+        if intensity_mode not in INTENSITY_MODES:
+            raise ValueError(f"Unknown intensity mode: {intensity_mode}")
         self.line_height = line_height or LINE_HEIGHT
+        self.intensity_mode = intensity_mode
+        # 0 means no limit
+        self.target_width = target_width if target_width is not None else TARGET_WIDTH
+        self.target_lines = target_lines if target_lines is not None else TARGET_LINES
+
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        """Create a processor configured by a ConversionParams"""
+        return cls(line_height=params.line_height, target_width=params.target_width,
+                   target_lines=params.target_lines, **kwargs)
     
     def load_image(self, image_path):
-        """Load and convert image to grayscale"""
+        """Load and convert image to grayscale, downscaled to target_size()"""
         image = Image.open(image_path)
-        grayscale = image.convert('L')
+        original_size = image.size
+        grayscale = self._decode_grayscale(image)
         image_array = np.array(grayscale)
         
         logger.debug(f"Loaded image: {image_path}")
-        logger.debug(f"Original image size: {image.size}")
+        logger.debug(f"Original image size: {original_size}")
         logger.debug(f"Image array shape: {image_array.shape}")
         logger.debug(f"Pixel intensity range: {image_array.min()} - {image_array.max()}")
         logger.debug(f"Average image intensity: {np.mean(image_array):.2f}")
         
         return image_array
     
+    def read_size(self, image_path):
+        """Size (width, height) the image is loaded at, read from the file header"""
+        with Image.open(image_path) as image:
+            return self.target_size(image.size)
+
+    def target_size(self, size):
+        """Size an image of the given size is decoded at
+
+        The image is scaled down, keeping its aspect ratio, until it is at
+        most target_width wide and has at most target_lines lines. It is
+        never scaled up.
+        """
+        width, height = size
+        scale = 1.0
+        if self.target_width:
+            scale = min(scale, self.target_width / width)
+        if self.target_lines:
+            scale = min(scale, self.target_lines * self.line_height / height)
+        if scale >= 1.0:
+            return size
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def _decode_grayscale(self, image):
+        """Decode an opened image to grayscale at target_size()
+
+        JPEG images are decoded straight at a reduced scale with draft mode.
+        The remaining reduction is a fast integer box reduce followed by an
+        area-averaging resize to the exact size.
+        """
+        target = self.target_size(image.size)
+        if target == image.size:
+            return image.convert('L')
+
+        # Lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding
+        image.draft('L', target)
+        grayscale = image.convert('L')
+
+        factor = min(grayscale.width // target[0], grayscale.height // target[1])
+        if factor > 1:
+            grayscale = grayscale.reduce(factor)
+        if grayscale.size != target:
+            grayscale = grayscale.resize(target, Image.Resampling.BOX)
+
+        logger.debug(f"Decoded {image.size} image at {grayscale.size}")
+        return grayscale
+
+    def decode_to_file(self, image_path, out_path, strip_rows=256):
+        """Decode an image to raw 8-bit grayscale rows in out_path
+
+        The grayscale conversion is done in strips and written straight to
+        disk, so no full grayscale array is ever held in memory. Pillow still
+        decodes the source image as a whole first.
+
+        Returns:
+            (width, height) of the image
+        """
+        with Image.open(image_path) as image:
+            if self.target_size(image.size) != image.size:
+                image = self._decode_grayscale(image)
+            width, height = image.size
+            image.load()
+            with open(out_path, 'wb') as f:
+                for y in range(0, height, strip_rows):
+                    strip = image.crop((0, y, width, min(y + strip_rows, height))).convert('L')
+                    f.write(strip.tobytes())
+
+        logger.debug(f"Decoded {image_path} ({width}x{height}) to {out_path}")
+        return width, height
+
+    def iter_file_lines(self, gray_path, width, height):
+        """Read a file from decode_to_file() one line (line_height rows) at a time"""
+        with open(gray_path, 'rb') as f:
+            for y in range(0, height, self.line_height):
+                rows = min(self.line_height, height - y)
+                yield np.fromfile(f, dtype=np.uint8, count=rows * width).reshape(rows, width)
+
+    def iter_line_intensities(self, lines):
+        """Pair each line segment with its column intensities, one line at a time"""
+        for line in lines:
+            yield line, line.mean(axis=0)
+
     def segment_into_lines(self, image_array):
         """Split image into horizontal lines of specified height"""
         height, width = image_array.shape
@@ -44,7 +187,119 @@ class ImageProcessor:
         return lines
     
     def calculate_line_intensities(self, lines):
-        """Calculate average intensity for each vertical column within each line"""
+        """Calculate average intensity for each vertical column within each line
+
+        Returns a 2D float array (num_lines x width) in 'vectorized' mode and
+        a list of per-line lists in 'reference' mode.
+        """
+        if self.intensity_mode == 'reference':
+            return self._calculate_line_intensities_reference(lines)
+
+        if len(lines) == 0:
+            return np.zeros((0, 0))
+
+        # Lines are consecutive bands of the same image, so stitch them back
+        # together and reduce everything in one pass
+        return self.calculate_intensity_matrix(np.concatenate(lines, axis=0))
+
+    def calculate_intensity_matrix(self, image_array):
+        """Calculate column intensities for all lines with batched reductions
+
+        Args:
+            image_array: 2D grayscale image array (height x width)
+
+        Returns:
+            intensities: float64 array of shape (num_lines, width); the last
+                         row averages the short band if height is not a
+                         multiple of line_height
+        """
+        height, width = image_array.shape
+        full_lines = height // self.line_height
+        full_height = full_lines * self.line_height
+
+        logger.debug(f"Calculating column intensities for {full_lines} full lines (vectorized)")
+
+        bands = image_array[:full_height].reshape(full_lines, self.line_height, width)
+        intensities = bands.mean(axis=1)
+
+        if full_height < height:
+            # Handle last line that is smaller than line_height
+            last_band = image_array[full_height:].mean(axis=0)
+            intensities = np.vstack([intensities, last_band])
+
+        logger.debug(f"Intensity matrix shape: {intensities.shape}")
+        return intensities
+
+    def build_intensity_index(self, image_array):
+        """Build a column-wise summed-area table of the image
+
+        Row i of the index holds, for every column, the sum of image rows
+        0..i-1, so the sum over any band of rows is the difference of two
+        index rows. The index does not depend on line_height and can be kept
+        per image to recompute intensities for any line height cheaply.
+
+        Returns:
+            integer array of shape (height + 1, width)
+        """
+        height, width = image_array.shape
+        # uint32 holds the column sums of images up to ~16.8M rows
+        dtype = np.uint32 if height * 255 <= np.iinfo(np.uint32).max else np.uint64
+
+        index = np.zeros((height + 1, width), dtype=dtype)
+        np.cumsum(image_array, axis=0, dtype=dtype, out=index[1:])
+
+        logger.debug(f"Built intensity index of shape {index.shape}")
+        return index
+
+    def intensities_from_index(self, index, offset=0):
+        """Calculate column intensities for all lines from a summed-area table
+
+        Args:
+            index: array from build_intensity_index()
+            offset: vertical offset of the line grid; rows above it form a
+                    shorter first line
+
+        Returns:
+            intensities: float64 array of shape (num_lines, width), equal to
+                         calculate_intensity_matrix() for offset 0
+        """
+        starts, ends = self.line_bounds(index.shape[0] - 1, offset)
+        band_sums = index[ends] - index[starts]
+        intensities = band_sums / (ends - starts)[:, np.newaxis]
+
+        logger.debug(f"Intensity matrix shape from index: {intensities.shape}")
+        return intensities
+
+    def line_bounds(self, height, offset=0):
+        """First and end row of every line of an image of the given height
+
+        offset is the vertical offset of the line grid; rows above it form a
+        shorter first line.
+        """
+        offset = offset % self.line_height
+        starts = np.arange(offset, height, self.line_height)
+        if offset > 0:
+            starts = np.concatenate([[0], starts])
+        ends = np.append(starts[1:], height)
+        return starts, ends
+
+    def calculate_column_sums(self, image_array):
+        """Sum every column within every line, as a (num_lines x width) float array"""
+        height, width = image_array.shape
+        full_lines = height // self.line_height
+        full_height = full_lines * self.line_height
+        dtype = np.float32 if self.line_height <= FLOAT32_MAX_ROWS else np.float64
+
+        column_sums = np.empty((-(-height // self.line_height), width), dtype=dtype)
+        bands = image_array[:full_height].reshape(full_lines, self.line_height, width)
+        bands.sum(axis=1, dtype=dtype, out=column_sums[:full_lines])
+        if full_height < height:
+            # Handle last line that is smaller than line_height
+            image_array[full_height:].sum(axis=0, dtype=dtype, out=column_sums[full_lines])
+        return column_sums
+
+    def _calculate_line_intensities_reference(self, lines):
+        """Reference per-column loop, kept to validate the vectorized path"""
         line_intensities = []
         
         logger.debug("Calculating column intensities for each line...")
@@ -72,14 +327,30 @@ class ImageProcessor:
     def process_image(self, image_path):
         """Complete processing pipeline: load -> segment -> calculate intensities"""
         image_array = self.load_image(image_path)
-        lines = self.segment_into_lines(image_array)
-        intensities = self.calculate_line_intensities(lines)
-        
-        return {
-            'image_array': image_array,
-            'lines': lines,
-            'intensities': intensities,
-            'width': image_array.shape[1],
-            'height': image_array.shape[0],
-            'num_lines': len(lines)
-        }
\ No newline at end of file
+        return self.process_array(image_array)
+
+    def process_array(self, image_array, intensity_index=None):
+        """Calculate the column intensities of an already loaded grayscale array
+
+        The column sums are taken from intensity_index, an array from
+        build_intensity_index(), if one is given.
+
+        Returns:
+            ProcessedImage
+        """
+        height, width = image_array.shape
+        starts, ends = self.line_bounds(height)
+        line_rows = ends - starts
+        if intensity_index is not None:
+            column_sums = intensity_index[ends] - intensity_index[starts]
+        elif self.intensity_mode == 'reference':
+            intensities = self.calculate_line_intensities(self.segment_into_lines(image_array))
+            # The means times the row counts round back to the exact sums
+            column_sums = np.rint(np.array(intensities, dtype=np.float64).reshape(len(starts), width)
+                                  * line_rows[:, np.newaxis])
+        else:
+            column_sums = self.calculate_column_sums(image_array)
+
+        processed = ProcessedImage(column_sums, line_rows, image_array[starts + line_rows // 2], width, height)
+        logger.debug(f"Processed {len(starts)} lines into {processed.nbytes} bytes")
+        return processed
\ No newline at end of file
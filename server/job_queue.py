@@ -0,0 +1,295 @@
+import time
+import logging
+import threading
+import multiprocessing
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config.config import JOB_WORKERS, JOB_QUEUE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs kept around for status queries
+JOB_HISTORY_LIMIT = 1000
+
+class QueueFullError(Exception):
+    """Raised when too many jobs are already queued or running"""
+
+
+class JobQueue:
+    """Runs conversions in a bounded pool of worker processes
+
+    Jobs are keyed by an id chosen by the caller; submitting a job under an
+    existing id replaces its record, so status always reflects the latest
+    job for that id. Jobs of one id run one after another, as they write
+    the same files: a job submitted while another of its id is running
+    waits for it, and a newer job takes the place of a waiting one. Only
+    the latest job's outcome is recorded and passed to its on_done.
+    Jobs submitted together form a group that takes one of the max_pending
+    slots however many jobs it holds, and at most max_workers jobs of a
+    group are in the pool at a time, so large batches are neither refused
+    nor allowed to crowd out other submissions. Workers report progress
+    through a shared dict. A worker dying fails the jobs in the pool, and
+    the next job starts a new pool.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or JOB_WORKERS
+        self.max_pending = max_pending or JOB_QUEUE_LIMIT
+        self._executor = None
+        self._manager = None
+        self._progress = None
+        self._jobs = OrderedDict()
+        # Job submitted to the pool and not yet finished, by id
+        self._running = {}
+        # Jobs not yet submitted to the pool, oldest first
+        self._waiting = []
+        self._groups = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, job_id, func, *args, on_done=None):
+        """Queue func(*args, progress=...) to run in a worker process
+
+        on_done, if given, is called in this process with the job's result
+        once it finishes successfully.
+
+        Returns:
+            status dict of the new job
+
+        Raises:
+            QueueFullError: if max_pending jobs are already queued or running
+        """
+        self.submit_many([(job_id, func, args, on_done)])
+        return self.status(job_id)
+
+    def submit_many(self, jobs):
+        """Queue several (job_id, func, args, on_done) jobs as one group
+
+        Raises:
+            QueueFullError: if max_pending jobs or groups are already queued or running
+        """
+        with self._lock:
+            active = len({job['group'] for job in self._jobs.values() if job['status'] in ('queued', 'running')})
+            if active >= self.max_pending:
+                raise QueueFullError(f"Too many conversions in progress ({active})")
+
+            self._ensure_pool()
+            group = next(self._groups)
+            for job_id, func, args, on_done in jobs:
+                job = {
+                    'id': job_id,
+                    'status': 'queued',
+                    'queued_at': time.time(),
+                    'started_at': None,
+                    'finished_at': None,
+                    'result': None,
+                    'error': None,
+                    'future': None,
+                    'executor': None,
+                    'on_done': on_done,
+                    'group': group,
+                    'call': (func, args)
+                }
+                self._jobs.pop(job_id, None)
+                self._jobs[job_id] = job
+                self._waiting.append(job)
+            submitted = self._feed()
+            self._prune()
+
+        for job in submitted:
+            self._watch(job)
+
+    def status(self, job_id):
+        """Report state, progress and timings of a job, or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+
+        # A waiting job has no progress yet; the shared entry is its predecessor's
+        shared = {}
+        progress = self._progress
+        if progress is not None and job['future'] is not None and job['status'] in ('queued', 'running'):
+            try:
+                shared = progress.get(job_id, {})
+            except (OSError, EOFError):
+                # The pool was replaced after a worker died
+                pass
+        started_at = shared.get('started_at') or job['started_at']
+        if job['status'] == 'queued' and started_at:
+            job['status'] = 'running'
+            job['started_at'] = started_at
+
+        lines_done = shared.get('lines_done', 0)
+        num_lines = shared.get('num_lines')
+        if job['status'] == 'done':
+            num_lines = job['result'].get('num_lines')
+            lines_done = num_lines
+
+        now = time.time()
+        started_at = job['started_at']
+        finished_at = job['finished_at'] or now
+        timings = {
+            'queued_seconds': round((started_at or finished_at) - job['queued_at'], 3),
+            'running_seconds': round(finished_at - started_at, 3) if started_at else 0.0,
+            'total_seconds': round(finished_at - job['queued_at'], 3)
+        }
+
+        status = {
+            'id': job_id,
+            'status': job['status'],
+            'progress': {'lines_done': lines_done, 'num_lines': num_lines},
+            'timings': timings
+        }
+        if job['result']:
+            status.update(job['result'])
+        if job['error']:
+            status['error'] = job['error']
+        return status
+
+    def shutdown(self):
+        """Stop the worker pool, waiting for running jobs to finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._manager.shutdown()
+            self._executor = None
+
+    def _ensure_pool(self):
+        if self._executor is None:
+            # Spawned workers avoid forking the threaded server mid-request
+            context = multiprocessing.get_context('spawn')
+            self._manager = context.Manager()
+            self._progress = self._manager.dict()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+            logger.debug(f"Started job pool with {self.max_workers} workers")
+
+    def _feed(self):
+        """Submit the waiting jobs that may run now; called with the lock held
+
+        A job waits while a job of its id is running or max_workers jobs of
+        its group are in the pool; jobs replaced meanwhile are dropped.
+
+        Returns:
+            the jobs submitted, to be watched once the lock is released
+        """
+        if self._executor is None:
+            return []
+        in_pool = {}
+        for job in self._running.values():
+            in_pool[job['group']] = in_pool.get(job['group'], 0) + 1
+
+        submitted, waiting = [], []
+        for job in self._waiting:
+            if self._jobs.get(job['id']) is not job:
+                continue
+            if job['id'] in self._running or in_pool.get(job['group'], 0) >= self.max_workers:
+                waiting.append(job)
+                continue
+            self._start(job)
+            in_pool[job['group']] = in_pool.get(job['group'], 0) + 1
+            submitted.append(job)
+        self._waiting = waiting
+        return submitted
+
+    def _start(self, job):
+        """Submit a job to the pool; called with the lock held"""
+        func, args = job.pop('call')
+        try:
+            self._progress.pop(job['id'], None)
+            job['future'] = self._executor.submit(_run_job, job['id'], self._progress, func, args)
+        except BrokenProcessPool:
+            # A worker died before the failed futures reported it
+            self._reset_pool(self._executor)
+            self._ensure_pool()
+            job['future'] = self._executor.submit(_run_job, job['id'], self._progress, func, args)
+        job['executor'] = self._executor
+        self._running[job['id']] = job
+
+    def _reset_pool(self, executor):
+        """Drop a pool broken by a dead worker, unless already replaced; called with the lock held"""
+        if executor is not self._executor:
+            return
+        logger.error("A job worker died; the next job starts a new pool")
+        self._executor.shutdown(wait=False)
+        self._manager.shutdown()
+        self._executor = self._manager = self._progress = None
+
+    def _watch(self, job):
+        job['future'].add_done_callback(lambda f, job=job: self._finish(job, f))
+        logger.debug(f"Queued job {job['id']}")
+
+    def _finish(self, job, future):
+        """Record the outcome of a job unless it was replaced meanwhile, then start jobs waiting for it
+
+        on_done runs without the lock, while the job still counts as running
+        so that no newer job of its id can start and finish before it.
+        """
+        error = future.exception()
+        with self._lock:
+            if isinstance(error, BrokenProcessPool):
+                self._reset_pool(job['executor'])
+            shared = {}
+            if self._progress is not None:
+                try:
+                    shared = self._progress.pop(job['id'], {})
+                except (OSError, EOFError):
+                    pass
+            job['started_at'] = job['started_at'] or shared.get('started_at')
+            latest = self._jobs.get(job['id']) is job
+
+        if latest and error is None and job['on_done'] is not None:
+            try:
+                job['on_done'](future.result())
+            except Exception as e:
+                logger.exception(f"Recording the result of job {job['id']} failed")
+                error = e
+
+        with self._lock:
+            if self._running.get(job['id']) is job:
+                del self._running[job['id']]
+            if latest:
+                self._record(job, future, error)
+            if self._waiting:
+                self._ensure_pool()
+            submitted = self._feed()
+
+        for waiting in submitted:
+            self._watch(waiting)
+
+    def _record(self, job, future, error):
+        """Store a finished job's outcome; called with the lock held"""
+        job['finished_at'] = time.time()
+        if error is None:
+            job['status'] = 'done'
+            job['result'] = future.result()
+        else:
+            job['status'] = 'failed'
+            job['error'] = str(error)
+            logger.error(f"Job {job['id']} failed: {error}")
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond JOB_HISTORY_LIMIT"""
+        finished = [job_id for job_id, job in self._jobs.items() if job['status'] in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self._jobs) - JOB_HISTORY_LIMIT)]:
+            del self._jobs[job_id]
+
+
+def _run_job(job_id, shared_progress, func, args):
+    """Worker-side wrapper that publishes start time and progress"""
+    state = {'started_at': time.time(), 'lines_done': 0, 'num_lines': None}
+    shared_progress[job_id] = dict(state)
+    last_update = [0.0]
+
+    def progress(lines_done, num_lines):
+        # Publishing goes through the manager process, so throttle it
+        now = time.time()
+        if lines_done < num_lines and now - last_update[0] < 0.2:
+            return
+        last_update[0] = now
+        state['lines_done'] = lines_done
+        state['num_lines'] = num_lines
+        shared_progress[job_id] = dict(state)
+
+    return func(*args, progress=progress)
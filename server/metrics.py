@@ -0,0 +1,167 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class StageTimer:
+    """Accumulates the wall time spent in each named stage
+
+    Stages may nest, for instance when the SVG writer pulls wave data from
+    a lazy generator; time is then charged to the innermost stage only, so
+    the stage times add up to the total.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self._active = []
+
+    @contextmanager
+    def stage(self, name):
+        """Charge the time spent in the with block to stage name"""
+        self._push(name)
+        try:
+            yield
+        finally:
+            self._pop()
+
+    def timed(self, iterable, name):
+        """Pass items through, charging the time spent producing them to stage name"""
+        iterator = iter(iterable)
+        while True:
+            self._push(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._pop()
+            yield item
+
+    def rounded(self, digits=4):
+        return {name: round(seconds, digits) for name, seconds in self.seconds.items()}
+
+    def _push(self, name):
+        now = time.perf_counter()
+        if self._active:
+            self._charge(self._active[-1], now)
+        self._active.append([name, now])
+
+    def _pop(self):
+        now = time.perf_counter()
+        self._charge(self._active.pop(), now)
+        if self._active:
+            self._active[-1][1] = now
+
+    def _charge(self, entry, now):
+        name, started = entry
+        self.seconds[name] = self.seconds.get(name, 0.0) + now - started
+        entry[1] = now
+
+
+def server_timing(seconds):
+    """Server-Timing header value for a dict of stage name -> seconds"""
+    return ", ".join(f"{name};dur={value * 1000:.1f}" for name, value in seconds.items())
+
+
+class Counter:
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values = {}
+
+    def inc(self, amount=1, label_value=None):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        if not self.values and self.label is None:
+            lines.append(f"{self.name} 0")
+        for label_value, value in sorted(self.values.items(), key=lambda item: str(item[0])):
+            lines.append(f"{self.name}{_labels(self.label, label_value)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label=None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, label_value=None):
+        counts, totals = self.series.setdefault(label_value, ([0] * len(self.buckets), [0, 0.0]))
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        totals[0] += 1
+        totals[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, (count, total)) in sorted(self.series.items(), key=lambda item: str(item[0])):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _labels(self.label, label_value, le=_number(bound))
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_labels(self.label, label_value, le='+Inf')} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label, label_value)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label, label_value)} {count}")
+        return lines
+
+
+class Metrics:
+    """Conversion latencies and volumes, exposed in the Prometheus text format
+
+    Conversions run in worker processes, so they report their stage times
+    and output sizes in their result and the server process records them
+    here once the job finishes.
+    """
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = Histogram('imagewave_stage_seconds', "Time spent in each conversion stage", 'stage')
+        self.request_seconds = Histogram('imagewave_request_seconds', "Time spent handling requests", 'endpoint')
+        self.conversions = Counter('imagewave_conversions_total', "Finished conversions by result cache outcome", 'cache')
+        self.pixels = Counter('imagewave_image_pixels_total', "Pixels of the converted images")
+        self.points = Counter('imagewave_points_total', "Path points written to generated SVGs")
+        self.svg_bytes = Counter('imagewave_svg_bytes_total', "Bytes of SVG written")
+        self._metrics = (self.stage_seconds, self.request_seconds, self.conversions,
+                         self.pixels, self.points, self.svg_bytes)
+
+    def record_conversion(self, result):
+        """Add a convert_image() result to the totals"""
+        with self._lock:
+            for stage, seconds in result.get('stage_seconds', {}).items():
+                self.stage_seconds.observe(seconds, stage)
+            self.conversions.inc(1, 'hit' if result.get('cache_hit') else 'miss')
+            self.pixels.inc(result.get('width', 0) * result.get('height', 0))
+            self.points.inc(result.get('points', 0))
+            self.svg_bytes.inc(result.get('svg_bytes', 0))
+
+    def record_request(self, endpoint, seconds):
+        with self._lock:
+            self.request_seconds.observe(seconds, endpoint)
+
+    def render(self):
+        with self._lock:
+            lines = [line for metric in self._metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(label, label_value, **extra):
+    pairs = [(label, label_value)] if label is not None else []
+    pairs += extra.items()
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,109 @@
+import logging
+import multiprocessing
+from multiprocessing import util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from config.config import LINE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Lines rendered by one worker task
+LINES_PER_TASK = 64
+
+# Pool reused by every conversion and sweep in this process, created on first use
+_executor = None
+_executor_workers = 0
+
+class ParallelLineRenderer:
+    """Renders the SVG markup of an image's lines on a pool of worker processes
+
+    Lines are independent of each other, so the grayscale image is placed in
+    shared memory once and workers turn ranges of lines into wave data and
+    path markup. Fragments are yielded in line order, with a bounded number
+    of ranges in flight.
+    """
+
+    def __init__(self, params, workers=None):
+        self.params = params
+        self.workers = workers or LINE_WORKERS
+
+    def iter_line_markup(self, image_array):
+        """Yield the markup of every line of image_array, in order"""
+        height, width = image_array.shape
+        line_height = self.params.line_height
+        num_lines = -(-height // line_height)
+        ranges = [(start, min(start + LINES_PER_TASK, num_lines))
+                  for start in range(0, num_lines, LINES_PER_TASK)]
+
+        shm = shared_memory.SharedMemory(create=True, size=max(image_array.nbytes, 1))
+        pending = deque()
+        try:
+            shared = np.ndarray(image_array.shape, dtype=np.uint8, buffer=shm.buf)
+            shared[:] = image_array
+            del shared
+
+            executor = get_executor(self.workers)
+            for start, end in ranges:
+                pending.append(executor.submit(_render_lines, shm.name, image_array.shape,
+                                               self.params, start, end))
+                if len(pending) >= 2 * self.workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            shm.close()
+            shm.unlink()
+
+        logger.debug(f"Rendered {num_lines} lines in {len(ranges)} tasks on {self.workers} workers")
+
+
+def shutdown():
+    """Stop this process's worker pool, if one was started"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+def get_executor(workers):
+    """This process's worker pool, with at least the given number of workers
+
+    A larger pool started earlier is reused, so conversions and sweeps
+    asking for different sizes do not restart it in turn.
+    """
+    global _executor, _executor_workers
+    if _executor is None or _executor_workers < workers:
+        shutdown()
+        # Spawned like the job workers, so no threads or locks are forked
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        _executor_workers = workers
+        # A job worker joins its children on exit before atexit handlers run,
+        # so stop the pool from a finalizer that runs before the pool's own
+        # queue finalizers (exitpriority 10)
+        util.Finalize(None, shutdown, exitpriority=20)
+    return _executor
+
+def _render_lines(shm_name, shape, params, start, end):
+    """Worker: markup of lines start..end-1 of the image in shared memory"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return _render_band(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf), params, start, end)
+    finally:
+        shm.close()
+
+def _render_band(image_array, params, start, end):
+    # Imported here because pipeline imports this module
+    from pipeline import build_generators
+
+    image_processor, sine_generator, svg_generator = build_generators(params)
+    line_height = image_processor.line_height
+
+    band = image_array[start * line_height:end * line_height]
+    intensities = image_processor.calculate_intensity_matrix(band)
+    segments = image_processor.segment_into_lines(band)
+
+    waves = sine_generator.iter_line_waves(zip(segments, intensities), image_array.shape[1], first_line=start)
+    return [svg_generator.line_markup(wave_data) for wave_data in waves]
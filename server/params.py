@@ -0,0 +1,141 @@
+import re
+import math
+from dataclasses import dataclass, asdict, fields, replace
+from config import config
+
+# Path geometries SVGGenerator can draw
+PATH_MODES = ('polyline', 'bezier', 'outline')
+
+# Tone curves ToneCurve can apply
+CURVE_KINDS = ('linear', 'gamma', 'scurve', 'piecewise')
+
+@dataclass(frozen=True)
+class ConversionParams:
+    """Immutable set of parameters for one conversion
+
+    Every request builds its own instance from the stored defaults plus any
+    overrides it carries and passes it explicitly through the pipeline, so
+    concurrent conversions never share mutable settings.
+    """
+    line_height: int
+    frequency_min: float
+    frequency_max: float
+    amplitude_min: float
+    amplitude_max: float
+    stroke_width_min: float
+    stroke_width_max: float
+    path_mode: str
+    bezier_tolerance: float
+    target_width: int = 0
+    target_lines: int = 0
+    tone_curve: str = 'linear'
+
+    def __post_init__(self):
+        for field in fields(self):
+            if field.type is float and not math.isfinite(getattr(self, field.name)):
+                raise ValueError(f"Invalid {field.name}: {getattr(self, field.name)}")
+        if self.line_height < 1:
+            raise ValueError(f"Invalid line height: {self.line_height}")
+        if self.target_width < 0 or self.target_lines < 0:
+            raise ValueError(f"Invalid target size: width {self.target_width}, lines {self.target_lines}")
+        # The same ranges the web form enforces
+        if not 0 < self.frequency_min < self.frequency_max:
+            raise ValueError(f"Invalid frequency range: {self.frequency_min} to {self.frequency_max}")
+        if not 0 < self.amplitude_min < self.amplitude_max:
+            raise ValueError(f"Invalid amplitude range: {self.amplitude_min} to {self.amplitude_max}")
+        if not 0 < self.stroke_width_min <= self.stroke_width_max:
+            raise ValueError(f"Invalid stroke width range: {self.stroke_width_min} to {self.stroke_width_max}")
+        if not self.bezier_tolerance > 0:
+            raise ValueError(f"Invalid Bézier tolerance: {self.bezier_tolerance}")
+        if self.path_mode not in PATH_MODES:
+            raise ValueError(f"Invalid path mode: {self.path_mode}")
+        parse_tone_curve(self.tone_curve)
+
+    @classmethod
+    def from_config(cls):
+        """Parameters from the values in the config module"""
+        return cls(
+            line_height=config.LINE_HEIGHT,
+            frequency_min=config.FREQUENCY_MIN,
+            frequency_max=config.FREQUENCY_MAX,
+            amplitude_min=config.AMPLITUDE_MIN,
+            amplitude_max=config.AMPLITUDE_MAX,
+            stroke_width_min=config.STROKE_WIDTH_MIN,
+            stroke_width_max=config.STROKE_WIDTH_MAX,
+            path_mode=config.SVG_PATH_MODE,
+            bezier_tolerance=config.BEZIER_TOLERANCE,
+            target_width=config.TARGET_WIDTH,
+            target_lines=config.TARGET_LINES,
+            tone_curve=config.TONE_CURVE
+        )
+
+    def with_overrides(self, overrides):
+        """Copy with values from a request dict; unknown keys are ignored
+
+        Raises:
+            ValueError: if a value cannot be converted or is out of range
+        """
+        changes = {}
+        for field in fields(self):
+            if field.name in (overrides or {}):
+                value = overrides[field.name]
+                try:
+                    changes[field.name] = _convert(field.type, value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Invalid {field.name}: {value!r}")
+        return replace(self, **changes)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def filename_suffix(self):
+        """Short tag of the main parameters for download filenames"""
+        suffix = (f"_fm{self.frequency_min}_fx{self.frequency_max}_am{self.amplitude_min}_ax{self.amplitude_max}"
+                  f"_sm{self.stroke_width_min}_sx{self.stroke_width_max}_lh{self.line_height}")
+        if self.target_width:
+            suffix += f"_tw{self.target_width}"
+        if self.target_lines:
+            suffix += f"_tl{self.target_lines}"
+        if self.tone_curve != 'linear':
+            suffix += "_tc" + re.sub(r'[^0-9A-Za-z.]+', '-', self.tone_curve)
+        # Replace dots with 'p' to avoid file extension confusion
+        return suffix.replace('.', 'p')
+
+
+def _convert(field_type, value):
+    """Value of a request field as field_type; ints must be whole numbers"""
+    if isinstance(value, bool):
+        raise TypeError("booleans are not parameter values")
+    if field_type is int and isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError("not a whole number")
+        return int(value)
+    return field_type(value)
+
+def parse_tone_curve(spec):
+    """Kind and values of a tone curve spec, as described in ToneCurve
+
+    Returns:
+        (kind, values): values is () for linear, (value,) for gamma and
+        scurve, and the (input, output) points in 0..255 for piecewise
+
+    Raises:
+        ValueError: if the spec is not a valid tone curve
+    """
+    kind, _, args = spec.strip().partition(':')
+    try:
+        if kind == 'gamma' or kind == 'scurve':
+            values = (float(args),)
+            valid = values[0] > 0
+        elif kind == 'piecewise':
+            values = tuple(tuple(float(v) for v in point.split('/')) for point in args.split(','))
+            valid = (len(values) >= 2 and all(len(point) == 2 and 0 <= point[1] <= 255 for point in values)
+                     and all(a[0] < b[0] for a, b in zip(values, values[1:])))
+        else:
+            values = ()
+            valid = kind in CURVE_KINDS and not args
+    except ValueError:
+        valid = False
+    if not valid:
+        raise ValueError(f"Invalid tone curve: {spec!r}")
+    return kind, values
@@ -0,0 +1,200 @@
+import numpy as np
+
+# Scaled values closer than this to a rounding tie are re-checked with Python's
+# formatter, since the fixed-point product can land on the wrong side of it
+TIE_TOLERANCE = 1e-6
+
+
+def format_path_data(x_coords, y_coords, decimals=1):
+    """Format a polyline as SVG path data in one batched operation
+
+    Produces exactly the same string as joining f"M{x:.1f},{y:.1f}" and
+    f"L{x:.1f},{y:.1f}" commands with spaces, for the given precision.
+    """
+    text, _, _ = _format_points(x_coords, y_coords, decimals)
+    return text
+
+
+def format_path_segments(x_coords, y_coords, bounds, decimals=1):
+    """Format several sub-polylines of one line with a single batched pass
+
+    Args:
+        x_coords, y_coords: coordinates of the whole line
+        bounds: iterable of (start, end) sample index pairs, end inclusive
+
+    Returns:
+        list of path data strings, one per (start, end) pair
+    """
+    text, starts, ends = _format_points(x_coords, y_coords, decimals)
+    return ["M" + text[starts[start]:ends[end]] for start, end in bounds]
+
+
+def format_cubic_path_data(start_point, controls, decimals=1):
+    """Format cubic Bézier segments as "M<x>,<y> c<c1> <c2> <end> ..." path data
+
+    Segments use relative 'c' commands and whole numbers drop their
+    fraction, which keeps numbers short. Every
+    point is rounded in absolute coordinates first and offsets are taken
+    between rounded values, so rounding error never accumulates along the path.
+
+    Args:
+        start_point: (x, y) where the path starts
+        controls: (num_segments, 6) array of absolute c1x, c1y, c2x, c2y, x, y
+    """
+    start = np.asarray(start_point, dtype=np.float64).reshape(1, 2)
+    controls = np.asarray(controls, dtype=np.float64).reshape(-1, 6)
+
+    if not (np.all(np.isfinite(start)) and np.all(np.isfinite(controls))):
+        raise ValueError("Cannot format non-finite Bézier coordinates")
+
+    start_fixed = round_fixed(start, decimals)
+    path_start = _format_fixed_rows(start_fixed, ("M", ","), decimals)
+    if len(controls) == 0:
+        return path_start
+
+    fixed = round_fixed(controls, decimals)
+    # Offsets are relative to the end point of the previous segment
+    origins = np.vstack([start_fixed, fixed[:-1, 4:6]])
+    relative = fixed - np.tile(origins, 3)
+
+    return path_start + _format_fixed_rows(relative, (" c", ",", " ", ",", " ", ","), decimals)
+
+
+def _format_fixed_rows(fixed, separators, decimals):
+    """Format a 2D array of fixed-point integers, writing separators[i] before column i"""
+    num_rows, num_columns = fixed.shape
+    flat = fixed.ravel()
+    chars, mask = _digit_columns(flat < 0, np.abs(flat), decimals, trim_whole=True)
+    value_width = chars.shape[1]
+
+    separator_width = max(len(separator) for separator in separators)
+    separator_chars = np.zeros((num_columns, separator_width), dtype=np.uint8)
+    separator_mask = np.zeros((num_columns, separator_width), dtype=bool)
+    for column, separator in enumerate(separators):
+        separator_chars[column, :len(separator)] = np.frombuffer(separator.encode('ascii'), dtype=np.uint8)
+        separator_mask[column, :len(separator)] = True
+
+    row_chars = np.concatenate([
+        np.broadcast_to(separator_chars, (num_rows, num_columns, separator_width)),
+        chars.reshape(num_rows, num_columns, value_width)
+    ], axis=2)
+    row_mask = np.concatenate([
+        np.broadcast_to(separator_mask, (num_rows, num_columns, separator_width)),
+        mask.reshape(num_rows, num_columns, value_width)
+    ], axis=2)
+
+    return row_chars[row_mask].tobytes().decode('ascii')
+
+
+def _format_points(x_coords, y_coords, decimals):
+    """Build "M<x>,<y> L<x>,<y> ..." plus the span of every point in it"""
+    x_coords = np.asarray(x_coords, dtype=np.float64)
+    y_coords = np.asarray(y_coords, dtype=np.float64)
+    num_points = len(x_coords)
+
+    if num_points == 0:
+        return "", np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+    if not (np.all(np.isfinite(x_coords)) and np.all(np.isfinite(y_coords))):
+        return _format_points_reference(x_coords, y_coords, decimals)
+
+    x_chars, x_mask = _fixed_point_columns(x_coords, decimals)
+    y_chars, y_mask = _fixed_point_columns(y_coords, decimals)
+
+    # One row per point: separator, command, x, comma, y
+    prefix_chars = np.empty((num_points, 2), dtype=np.uint8)
+    prefix_chars[:, 0] = ord(' ')
+    prefix_chars[:, 1] = ord('L')
+    prefix_chars[0, 1] = ord('M')
+    prefix_mask = np.ones((num_points, 2), dtype=bool)
+    prefix_mask[0, 0] = False
+
+    comma_chars = np.full((num_points, 1), ord(','), dtype=np.uint8)
+    comma_mask = np.ones((num_points, 1), dtype=bool)
+
+    chars = np.hstack([prefix_chars, x_chars, comma_chars, y_chars])
+    mask = np.hstack([prefix_mask, x_mask, comma_mask, y_mask])
+
+    text = chars[mask].tobytes().decode('ascii')
+
+    row_lengths = mask.sum(axis=1)
+    ends = np.cumsum(row_lengths)
+    starts = ends - row_lengths + prefix_mask.sum(axis=1)
+
+    return text, starts, ends
+
+
+def _format_points_reference(x_coords, y_coords, decimals):
+    """Per-point f-string formatting, used for non-finite coordinates"""
+    tokens = [f"{x:.{decimals}f},{y:.{decimals}f}" for x, y in zip(x_coords, y_coords)]
+    text = "M" + " L".join(tokens)
+
+    lengths = np.array([len(token) for token in tokens])
+    ends = np.cumsum(lengths + 2) - 1
+    starts = ends - lengths
+
+    return text, starts, ends
+
+
+def _fixed_point_columns(values, decimals):
+    """Lay out formatted numbers as a right-aligned character matrix
+
+    Returns a (len(values), columns) uint8 matrix of ASCII characters and a
+    boolean mask selecting the characters that belong to each number.
+    Columns are: sign, integer digits, decimal point, fraction digits.
+    """
+    return _digit_columns(np.signbit(values), round_fixed(np.abs(values), decimals), decimals)
+
+
+def round_fixed(values, decimals):
+    """Round values to integers in units of 10**-decimals, like Python's formatter"""
+    scaled = values * 10 ** decimals
+    fixed = np.rint(scaled).astype(np.int64)
+
+    # Resolve values near a rounding tie with Python's exact formatting
+    magnitude = np.abs(scaled)
+    near_tie = np.abs(magnitude - np.floor(magnitude) - 0.5) < TIE_TOLERANCE
+    for idx in zip(*np.nonzero(near_tie)):
+        fixed[idx] = int(f"{values[idx]:.{decimals}f}".replace('.', ''))
+
+    return fixed
+
+
+def _digit_columns(negative, fixed, decimals, trim_whole=False):
+    """Character matrix and mask for non-negative fixed-point integers and their signs
+
+    With trim_whole, whole numbers are written without a fraction ("3" instead of "3.0").
+    """
+    scale = 10 ** decimals
+    integer_part = fixed // scale
+    fraction_part = fixed % scale
+
+    int_columns = len(str(int(integer_part.max())))
+    num_values = len(fixed)
+    columns = 1 + int_columns + (1 + decimals if decimals > 0 else 0)
+
+    chars = np.empty((num_values, columns), dtype=np.uint8)
+    mask = np.ones((num_values, columns), dtype=bool)
+
+    chars[:, 0] = ord('-')
+    mask[:, 0] = negative
+
+    # Integer digits, most significant first, without leading zeros
+    num_digits = np.ones(num_values, dtype=np.int64)
+    for power in range(1, int_columns):
+        num_digits += integer_part >= 10 ** power
+    for column in range(int_columns):
+        power = int_columns - 1 - column
+        chars[:, 1 + column] = (integer_part // 10 ** power) % 10 + ord('0')
+        mask[:, 1 + column] = num_digits > power
+
+    if decimals > 0:
+        point_column = 1 + int_columns
+        chars[:, point_column] = ord('.')
+        for column in range(decimals):
+            power = decimals - 1 - column
+            chars[:, point_column + 1 + column] = (fraction_part // 10 ** power) % 10 + ord('0')
+        if trim_whole:
+            mask[:, point_column:] = (fraction_part != 0)[:, np.newaxis]
+
+    return chars, mask
@@ -0,0 +1,370 @@
+import os
+import gzip
+import time
+import shutil
+import uuid
+import tempfile
+import logging
+import contextlib
+from image_processor import ImageProcessor
+from sine_generator import SineGenerator
+from svg_generator import SVGGenerator
+from result_cache import ResultCache
+from stage_cache import StageCache
+from parallel_lines import ParallelLineRenderer
+from metrics import StageTimer
+from wave_store import WaveStoreWriter, open_wave_store
+from config.config import STREAMING_MIN_PIXELS, LINE_WORKERS, SVGZ_COMPRESSLEVEL
+
+logger = logging.getLogger(__name__)
+
+def build_generators(params):
+    """Create the pipeline stages configured by a ConversionParams"""
+    image_processor = ImageProcessor.from_params(params)
+    sine_generator = SineGenerator.from_params(params)
+    svg_generator = SVGGenerator.from_params(params)
+    return image_processor, sine_generator, svg_generator
+
+def convert_image(image_path, svg_path, params, stage_dir=None, progress=None, use_cache=True, compress=False,
+                  wave_store=None):
+    """Run the load -> segment -> wave -> SVG pipeline for one image
+
+    Finished SVGs are stored in the ResultCache unless use_cache is False
+    or the output is a stream, so converting the same pixels with the same
+    parameters again just copies the cached file. With
+    a stage_dir, intermediate results are kept there as well and only the
+    stages downstream of changed parameters are recomputed. Images of at
+    least STREAMING_MIN_PIXELS pixels are streamed line by line instead.
+    With compress, a gzip copy is written to svg_path + 'z' (.svgz) as the
+    SVG streams out. With a wave_store path, the wave data is also kept
+    there as a WaveStore for exporters; a result cache hit rebuilds it only
+    if the stored waves were made with other wave parameters. Lines
+    rendered by line workers are not stored.
+
+    Args:
+        image_path: path of the uploaded image
+        svg_path: where to write the SVG, or a writable text stream
+        params: ConversionParams to convert with
+        stage_dir: optional directory for per-upload intermediate results
+        progress: optional callable(lines_done, num_lines)
+        use_cache: whether to look up and store the result in the ResultCache
+        compress: whether to also write a .svgz copy; ignored for streams
+        wave_store: optional directory to store the wave data in
+
+    Returns:
+        dict with the image 'width', 'height', 'num_lines', whether the
+        result came from the cache ('cache_hit'), the seconds spent in
+        each stage ('stage_seconds') and the 'svg_bytes' and path
+        'points' written (points only when the SVG was generated)
+    """
+    image_processor, sine_generator, svg_generator = build_generators(params)
+    result_cache = ResultCache() if use_cache and not _is_stream(svg_path) else None
+    timer = StageTimer()
+
+    width, height = image_processor.read_size(image_path)
+    if width * height >= STREAMING_MIN_PIXELS:
+        return _convert_streaming(image_path, svg_path, params, result_cache, progress, timer, compress,
+                                  wave_store, image_processor, sine_generator, svg_generator)
+
+    stage_cache = StageCache(stage_dir) if stage_dir else None
+    with timer.stage('decode'):
+        image_array = _run_stage(stage_cache, 'grayscale', params,
+                                 lambda: {'image_array': image_processor.load_image(image_path)})['image_array']
+    height, width = image_array.shape
+    num_lines = -(-height // image_processor.line_height)
+
+    if result_cache is not None:
+        with timer.stage('cache'):
+            cache_key = ResultCache.key(image_array, params)
+            cache_hit = result_cache.get(cache_key, svg_path)
+        if cache_hit:
+            if compress:
+                with timer.stage('svg'):
+                    compress_svg(svg_path)
+            if wave_store is not None and open_wave_store(wave_store, params) is None:
+                with timer.stage('waves'):
+                    sine_waves = sine_generator.iter_sine_waves(image_processor.process_array(image_array))
+                    _store_waves(wave_store, sine_waves, width, height, params)
+            if progress is not None:
+                progress(num_lines, num_lines)
+            return _result(width, height, num_lines, timer, cache_hit=True,
+                           svg_bytes=os.path.getsize(svg_path))
+
+    if LINE_WORKERS > 1:
+        # Workers recompute intensities and waves for their lines, which is
+        # cheaper than shipping stored stages to them
+        line_markup = ParallelLineRenderer(params, LINE_WORKERS).iter_line_markup(image_array)
+        line_markup = timer.timed(line_markup, 'lines')
+        if progress is not None:
+            line_markup = _track_progress(line_markup, num_lines, progress)
+        with timer.stage('svg'):
+            output = _write_output(svg_generator.iter_svg_document(line_markup, width, height), svg_path, compress)
+    else:
+        if stage_cache is None:
+            with timer.stage('intensities'):
+                processed = image_processor.process_array(image_array)
+            sine_waves = sine_generator.iter_sine_waves(processed)
+        else:
+            sine_waves = _staged_sine_waves(stage_cache, params, image_array, image_processor,
+                                            sine_generator, timer)
+
+        sine_waves = timer.timed(sine_waves, 'waves')
+        if progress is not None:
+            sine_waves = _track_progress(sine_waves, num_lines, progress)
+
+        with _wave_store_writer(wave_store, width, height, params) as writer:
+            if writer is not None:
+                sine_waves = writer.tee(sine_waves)
+            with timer.stage('svg'):
+                output = write_svg(svg_generator, sine_waves, width, height, svg_path, compress)
+
+    if result_cache is not None:
+        with timer.stage('cache'):
+            result_cache.put(cache_key, svg_path)
+
+    return _result(width, height, num_lines, timer, cache_hit=False, **output)
+
+def convert_variants(image_path, outputs, stage_dir=None, progress=None):
+    """Convert one image with several parameter sets
+
+    The parameter sets share a stage_dir, so the image is decoded once and
+    its intensity index is reused by every set with the same target size.
+    A failing set is reported in its result and does not stop the others.
+
+    Args:
+        image_path: path of the image
+        outputs: list of (svg_path, ConversionParams) pairs
+        stage_dir: optional directory for the image's intermediate results
+        progress: optional callable(sets_done, num_sets)
+
+    Returns:
+        dict with 'results', one dict per output holding the
+        convert_image() result or an 'error', plus the time in 'seconds'
+    """
+    results = []
+    for svg_path, params in outputs:
+        start = time.perf_counter()
+        try:
+            result = convert_image(image_path, svg_path, params, stage_dir)
+        except Exception as e:
+            logger.error(f"Converting {image_path} to {svg_path} failed: {e}")
+            result = {'error': str(e)}
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        results.append(result)
+
+        if progress is not None:
+            progress(len(results), len(outputs))
+    return {'results': results}
+
+def _convert_streaming(image_path, svg_path, params, result_cache, progress, timer, compress,
+                       wave_store, image_processor, sine_generator, svg_generator):
+    """Convert one line at a time so memory use does not grow with image height
+
+    The image is decoded once to a raw grayscale file next to the output;
+    every line is then read, converted to wave data and written to the SVG
+    before the next one is read. Intermediate stages are not kept.
+    """
+    if _is_stream(svg_path):
+        fd, gray_path = tempfile.mkstemp(suffix='.gray')
+        os.close(fd)
+    else:
+        gray_path = f"{svg_path}.{uuid.uuid4().hex}.gray"
+    try:
+        with timer.stage('decode'):
+            width, height = image_processor.decode_to_file(image_path, gray_path)
+        num_lines = -(-height // image_processor.line_height)
+
+        if result_cache is not None:
+            with timer.stage('cache'):
+                lines = image_processor.iter_file_lines(gray_path, width, height)
+                cache_key = ResultCache.key_for_chunks('uint8', (height, width), lines, params)
+                cache_hit = result_cache.get(cache_key, svg_path)
+            if cache_hit:
+                if compress:
+                    with timer.stage('svg'):
+                        compress_svg(svg_path)
+                if wave_store is not None and open_wave_store(wave_store, params) is None:
+                    with timer.stage('waves'):
+                        lines = image_processor.iter_file_lines(gray_path, width, height)
+                        sine_waves = sine_generator.iter_line_waves(image_processor.iter_line_intensities(lines), width)
+                        _store_waves(wave_store, sine_waves, width, height, params)
+                if progress is not None:
+                    progress(num_lines, num_lines)
+                return _result(width, height, num_lines, timer, cache_hit=True,
+                               svg_bytes=os.path.getsize(svg_path))
+
+        lines = image_processor.iter_file_lines(gray_path, width, height)
+        line_intensities = timer.timed(image_processor.iter_line_intensities(lines), 'intensities')
+        sine_waves = timer.timed(sine_generator.iter_line_waves(line_intensities, width), 'waves')
+        if progress is not None:
+            sine_waves = _track_progress(sine_waves, num_lines, progress)
+
+        with _wave_store_writer(wave_store, width, height, params) as writer:
+            if writer is not None:
+                sine_waves = writer.tee(sine_waves)
+            with timer.stage('svg'):
+                output = write_svg(svg_generator, sine_waves, width, height, svg_path, compress)
+    finally:
+        if os.path.exists(gray_path):
+            os.remove(gray_path)
+
+    if result_cache is not None:
+        with timer.stage('cache'):
+            result_cache.put(cache_key, svg_path)
+    logger.debug(f"Streamed {num_lines} lines of {image_path}")
+
+    return _result(width, height, num_lines, timer, cache_hit=False, **output)
+
+def _result(width, height, num_lines, timer, cache_hit, svg_bytes, points=None):
+    result = {
+        'width': width,
+        'height': height,
+        'num_lines': num_lines,
+        'cache_hit': cache_hit,
+        'stage_seconds': timer.rounded(),
+        'svg_bytes': svg_bytes
+    }
+    if points is not None:
+        result['points'] = points
+    return result
+
+def _staged_sine_waves(stage_cache, params, image_array, image_processor, sine_generator, timer):
+    """Wave data for every line, reusing the stored intensity index, waves and widths"""
+    # The index is independent of line_height, so changing it only costs a
+    # couple of row subtractions per line
+    with timer.stage('intensities'):
+        intensity_index = _run_stage(
+            stage_cache, 'intensity_index', params,
+            lambda: {'index': image_processor.build_intensity_index(image_array)}
+        )['index']
+        processed = image_processor.process_array(image_array, intensity_index)
+
+    with timer.stage('waves'):
+        wave_arrays = _run_stage(
+            stage_cache, 'waves', params,
+            lambda: sine_generator.generate_wave_arrays(processed, include_widths=False)
+        )
+        wave_arrays['widths'] = _run_stage(
+            stage_cache, 'widths', params,
+            lambda: {'widths': sine_generator.generate_width_arrays(processed)}
+        )['widths']
+
+    return sine_generator.iter_wave_rows(wave_arrays)
+
+def export_svg(store, svg_path, params, compress=False):
+    """Write an SVG from a WaveStore, formatted with the SVG settings of params
+
+    Only the path mode and Bézier tolerance of params are used, so the
+    same stored waves can be exported in any path mode without running
+    the wave synthesis again. Coordinates are stored as float32, so the
+    output can differ from a fresh conversion in the last digit. Stores
+    made outside the bezier path mode have no Bézier data, and export as
+    polylines in that mode.
+    """
+    svg_generator = SVGGenerator.from_params(params)
+    return write_svg(svg_generator, store.iter_waves(), store.width, store.height, svg_path, compress)
+
+def _wave_store_writer(wave_store, width, height, params):
+    if wave_store is None:
+        return contextlib.nullcontext()
+    return WaveStoreWriter(wave_store, width, height, params)
+
+def _store_waves(wave_store, sine_waves, width, height, params):
+    with WaveStoreWriter(wave_store, width, height, params) as writer:
+        for wave_data in sine_waves:
+            writer.add(wave_data)
+
+def _run_stage(stage_cache, stage, params, compute):
+    """Load a stage's arrays from the stage cache, computing and storing them on a miss"""
+    if stage_cache is None:
+        return compute()
+
+    arrays = stage_cache.load(stage, params)
+    if arrays is None:
+        arrays = compute()
+        stage_cache.store(stage, params, arrays)
+    return arrays
+
+def write_svg(svg_generator, sine_waves, width, height, svg_path, compress=False):
+    """Stream the SVG for the given waves to svg_path (or a text stream) line by line
+
+    With compress, a gzip copy is written to svg_path + 'z' in the same pass.
+
+    Returns:
+        dict with the 'svg_bytes' and path 'points' written
+    """
+    return _write_output(svg_generator.iter_optimized_svg(sine_waves, width, height), svg_path, compress)
+
+def _is_stream(svg_path):
+    return hasattr(svg_path, 'write')
+
+def compress_svg(svg_path):
+    """Write a gzip copy of an existing SVG file to svg_path + 'z'"""
+    svgz_path = svg_path + 'z'
+    tmp_path = f"{svgz_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(svg_path, 'rb') as src, open(tmp_path, 'wb') as raw, _gzip_writer(raw) as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, svgz_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return svgz_path
+
+def _gzip_writer(raw):
+    # No name or timestamp in the header, so equal SVGs compress to equal files
+    return gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=SVGZ_COMPRESSLEVEL, mtime=0)
+
+def _write_output(chunks, svg_path, compress=False):
+    """Write text chunks to a stream, or to svg_path replacing it only once complete
+
+    With compress, the chunks are also gzipped into svg_path + 'z'.
+    """
+    output = {'svg_bytes': 0, 'points': 0}
+    chunks = _count_output(chunks, output)
+    if _is_stream(svg_path):
+        for chunk in chunks:
+            svg_path.write(chunk)
+        return output
+
+    # Write next to the target and swap it in so readers never see a partial file
+    suffix = uuid.uuid4().hex
+    tmp_path = f"{svg_path}.{suffix}.tmp"
+    tmp_svgz_path = f"{svg_path}z.{suffix}.tmp" if compress else None
+    try:
+        with open(tmp_path, 'w') as f:
+            if compress:
+                with open(tmp_svgz_path, 'wb') as raw, _gzip_writer(raw) as gz:
+                    for chunk in chunks:
+                        f.write(chunk)
+                        gz.write(chunk.encode())
+            else:
+                for chunk in chunks:
+                    f.write(chunk)
+        # The SVG goes first; readers only use a .svgz at least as new as it
+        os.replace(tmp_path, svg_path)
+        if compress:
+            os.replace(tmp_svgz_path, svg_path + 'z')
+    finally:
+        for path in (tmp_path, tmp_svgz_path):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+    return output
+
+def _count_output(chunks, output):
+    """Pass chunks through, counting bytes and path points into output
+
+    The markup is ASCII, and every point in path data is written as one
+    "x,y" pair, so points are counted by their commas.
+    """
+    for chunk in chunks:
+        output['svg_bytes'] += len(chunk)
+        output['points'] += chunk.count(',')
+        yield chunk
+
+def _track_progress(sine_waves, num_lines, progress):
+    """Pass per-line items through, reporting each finished line"""
+    progress(0, num_lines)
+    for line_idx, wave_data in enumerate(sine_waves):
+        yield wave_data
+        progress(line_idx + 1, num_lines)
@@ -0,0 +1,41 @@
+import io
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Longest side of preview images unless asked otherwise
+PREVIEW_SIZE = 1024
+
+def render_preview(store, max_size=None):
+    """Draw the waves of a WaveStore into a grayscale PIL image"""
+    return render_waves(store.iter_waves(), store.width, store.height, max_size)
+
+def render_waves(sine_waves, width, height, max_size=None):
+    """Draw wave data into a grayscale PIL image
+
+    The image is scaled down to fit max_size; lines are drawn with their
+    mean stroke width and only about one point per output pixel.
+    """
+    max_size = max_size or PREVIEW_SIZE
+    scale = min(1.0, max_size / max(width, height, 1))
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    image = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(image)
+
+    step = max(1, int(1 / scale))
+    for wave_data in sine_waves:
+        x_coords = wave_data['x_coords']
+        if len(x_coords) == 0:
+            continue
+        # Keep the last point so lines reach the right edge
+        indices = np.unique(np.append(np.arange(0, len(x_coords), step), len(x_coords) - 1))
+        points = np.column_stack([x_coords[indices], wave_data['y_coords'][indices]]) * scale
+        stroke_width = max(1, round(float(np.mean(wave_data['widths'])) * scale))
+        draw.line(points.ravel().tolist(), fill=0, width=stroke_width)
+
+    return image
+
+def preview_png(store, max_size=None):
+    """PNG bytes of render_preview()"""
+    out = io.BytesIO()
+    render_preview(store, max_size).save(out, 'PNG', optimize=False)
+    return out.getvalue()
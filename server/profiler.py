@@ -0,0 +1,143 @@
+import os
+import time
+import pstats
+import cProfile
+import logging
+import linecache
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Allocation sites listed in the report
+TOP_ALLOCATIONS = 25
+
+# How often traced memory is checked for a new peak, in seconds
+PEAK_CHECK_INTERVAL = 0.05
+
+class Profile:
+    """cProfile statistics and peak allocation sites of a profiled block
+
+    The pstats dump is written to <prefix>.prof and the report of the
+    largest allocation sites to <prefix>.alloc.txt. tracemalloc only knows
+    about live memory, so a watcher thread snapshots the allocations
+    whenever the traced total reaches a new high; the report lists the
+    sites of the highest snapshot.
+    """
+
+    def __init__(self, prefix, top_allocations=None):
+        self.stats_path = f"{prefix}.prof"
+        self.allocations_path = f"{prefix}.alloc.txt"
+        self.top_allocations = top_allocations or TOP_ALLOCATIONS
+        self.seconds = None
+        self.peak_bytes = None
+        self._profiler = cProfile.Profile()
+        self._peak_snapshot = None
+        self._snapshot_bytes = 0
+        self._stop = threading.Event()
+
+    def paths(self):
+        return {'stats': self.stats_path, 'allocations': self.allocations_path}
+
+    def top_functions(self, count=10):
+        """(function, calls, cumulative seconds) of the slowest functions by cumulative time"""
+        stats = pstats.Stats(self.stats_path)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [(pstats.func_std_string(func), calls, round(cumulative, 4))
+                for func, (_, calls, _, cumulative, _) in rows[:count]]
+
+    def _start(self):
+        self._tracing_before = tracemalloc.is_tracing()
+        if not self._tracing_before:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self._watcher = threading.Thread(target=self._watch_peak, daemon=True)
+        self._watcher.start()
+        self._started = time.perf_counter()
+        self._profiler.enable()
+
+    def _finish(self):
+        self._profiler.disable()
+        self.seconds = time.perf_counter() - self._started
+        self._stop.set()
+        self._watcher.join()
+        self._check_peak()
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        if not self._tracing_before:
+            tracemalloc.stop()
+
+        self._profiler.dump_stats(self.stats_path)
+        with open(self.allocations_path, 'w') as f:
+            f.write(self._allocation_report())
+        logger.debug(f"Wrote profile to {self.stats_path} and {self.allocations_path}")
+
+    def _watch_peak(self):
+        while not self._stop.wait(PEAK_CHECK_INTERVAL):
+            self._check_peak()
+
+    def _check_peak(self):
+        current = tracemalloc.get_traced_memory()[0]
+        if current > self._snapshot_bytes:
+            self._peak_snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            self._snapshot_bytes = current
+
+    def _allocation_report(self):
+        lines = [
+            f"Wall time: {self.seconds:.3f}s",
+            f"Peak traced memory: {self.peak_bytes / 1024 / 1024:.1f} MiB",
+            f"Largest snapshot: {self._snapshot_bytes / 1024 / 1024:.1f} MiB",
+            "",
+            f"Top {self.top_allocations} allocation sites in the largest snapshot:",
+        ]
+        if self._peak_snapshot is not None:
+            statistics = self._peak_snapshot.statistics('lineno')
+            for rank, stat in enumerate(statistics[:self.top_allocations], 1):
+                frame = stat.traceback[0]
+                lines.append(f"{rank:3}. {frame.filename}:{frame.lineno}: "
+                             f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+                source = linecache.getline(frame.filename, frame.lineno).strip()
+                if source:
+                    lines.append(f"       {source}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiled(prefix, top_allocations=None):
+    """Profile the with block with cProfile and tracemalloc
+
+    Example:
+        with profiled('out/face') as profile:
+            processed = ImageProcessor().process_image('face.png')
+            sine_waves = SineGenerator().generate_sine_waves(processed)
+            SVGGenerator().generate_optimized_svg(sine_waves, processed.width, processed.height)
+        print(profile.top_functions())
+
+    The files are written when the block exits, also if it raises.
+    """
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    profile = Profile(prefix, top_allocations)
+    profile._start()
+    try:
+        yield profile
+    finally:
+        profile._finish()
+
+def run_profiled(prefix, func, *args, progress=None):
+    """Job function: run func(*args, progress=progress) under profiled(prefix)
+
+    Returns:
+        func's result dict plus the profile's 'profile_seconds' and
+        'profile_peak_bytes'
+    """
+    with profiled(prefix) as profile:
+        result = func(*args, progress=progress)
+    result['profile_seconds'] = round(profile.seconds, 4)
+    result['profile_peak_bytes'] = profile.peak_bytes
+    return result
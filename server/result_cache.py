@@ -0,0 +1,122 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import numpy as np
+from config.config import CACHE_DIR, CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Bump when generator changes alter the SVG produced for the same inputs
+CACHE_VERSION = 1
+
+class ResultCache:
+    """Disk-backed cache of finished SVGs keyed by image content and parameters
+
+    Entries are plain files named by their key. A hit refreshes the file's
+    modification time, so evicting the oldest files first is LRU eviction.
+    Several worker processes may share the directory; every write is an
+    atomic rename and eviction tolerates files that vanish underneath it.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(image_array, params):
+        """Hash the decoded image pixels together with every conversion parameter"""
+        return ResultCache.key_for_chunks(image_array.dtype, image_array.shape, [image_array], params)
+
+    @staticmethod
+    def key_for_chunks(dtype, shape, chunks, params):
+        """Same key as key(), from an image given as consecutive row chunks"""
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}:{np.dtype(dtype)}:{tuple(shape)}".encode())
+        digest.update(json.dumps(params.to_dict(), sort_keys=True).encode())
+        for chunk in chunks:
+            digest.update(np.ascontiguousarray(chunk))
+        return digest.hexdigest()
+
+    def get(self, key, dest_path):
+        """Copy the cached SVG for key to dest_path; returns False on a miss"""
+        cached_path = self._path(key)
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            shutil.copyfile(cached_path, tmp_path)
+            os.utime(cached_path)
+        except FileNotFoundError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, dest_path)
+        logger.debug(f"Cache hit for {key}")
+        return True
+
+    def put(self, key, svg_path):
+        """Store a copy of svg_path under key and evict entries over the size cap"""
+        tmp_path = f"{self._path(key)}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(svg_path, tmp_path)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.svg'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                logger.debug(f"Evicted cache entry {name}")
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def record(self, hit):
+        """Count a lookup; workers do the lookups and report them back with job results"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Hit/miss counters and current size of the cache"""
+        sizes = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.svg'):
+                try:
+                    sizes.append(os.path.getsize(os.path.join(self.directory, name)))
+                except FileNotFoundError:
+                    pass
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(sizes),
+                'bytes': sum(sizes),
+                'max_bytes': self.max_bytes
+            }
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.svg")
@@ -3,17 +3,29 @@ import logging
 from frequency_mapper import FrequencyMapper
 from amplitude_mapper import AmplitudeMapper
 from width_mapper import WidthMapper
-from config.config import LINE_HEIGHT, AMPLITUDE, FREQUENCY_MIN, FREQUENCY_MAX, AMPLITUDE_MIN, AMPLITUDE_MAX, STROKE_WIDTH_MIN, STROKE_WIDTH_MAX
+from tone_curve import ToneCurve
+from config.config import LINE_HEIGHT, AMPLITUDE, FREQUENCY_MIN, FREQUENCY_MAX, AMPLITUDE_MIN, AMPLITUDE_MAX, STROKE_WIDTH_MIN, STROKE_WIDTH_MAX, TONE_CURVE
 
 logger = logging.getLogger(__name__)
 
+# Frequencies at or below this are drawn as a flat line
+FLAT_FREQUENCY_THRESHOLD = 0.001
+
+WAVE_MODES = ('batched', 'reference')
+
+# Per-sample arrays produced by batched synthesis, one row per line
+LINE_ARRAY_KEYS = ('y_coords', 'phase', 'frequencies', 'amplitudes')
+
 class SineGenerator:
     def __init__(self, line_height=None, amplitude_factor=None, samples_per_pixel=1,
                  frequency_min=None, frequency_max=None, amplitude_min=None, amplitude_max=None,
-                 width_min=None, width_max=None):
+                 width_min=None, width_max=None, tone_curve=None, wave_mode='batched'):
+        if wave_mode not in WAVE_MODES:
+            raise ValueError(f"Unknown wave mode: {wave_mode}")
         self.line_height = line_height or LINE_HEIGHT
         self.base_amplitude = amplitude_factor or AMPLITUDE
         self.samples_per_pixel = samples_per_pixel
+        self.wave_mode = wave_mode
 
         # Use provided parameters or fall back to config values
         freq_min = frequency_min if frequency_min is not None else FREQUENCY_MIN
@@ -23,27 +35,49 @@ class SineGenerator:
         w_min = width_min if width_min is not None else STROKE_WIDTH_MIN
         w_max = width_max if width_max is not None else STROKE_WIDTH_MAX
 
-        self.frequency_mapper = FrequencyMapper(freq_min, freq_max)
-        self.amplitude_mapper = AmplitudeMapper(amp_min, amp_max)
-        self.width_mapper = WidthMapper(w_min, w_max)
+        # The curve is built into the mappers' lookup tables, so it costs
+        # nothing per sample
+        curve = ToneCurve(tone_curve if tone_curve is not None else TONE_CURVE)
+
+        self.frequency_mapper = FrequencyMapper(freq_min, freq_max, curve)
+        self.amplitude_mapper = AmplitudeMapper(amp_min, amp_max, curve)
+        self.width_mapper = WidthMapper(w_min, w_max, curve)
+
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        """Create a generator configured by a ConversionParams"""
+        return cls(
+            line_height=params.line_height,
+            frequency_min=params.frequency_min,
+            frequency_max=params.frequency_max,
+            amplitude_min=params.amplitude_min,
+            amplitude_max=params.amplitude_max,
+            width_min=params.stroke_width_min,
+            width_max=params.stroke_width_max,
+            tone_curve=params.tone_curve,
+            **kwargs
+        )
     
-    def generate_sine_waves(self, processed_data):
-        """Generate sine wave data for all lines in the image"""
-        intensities = processed_data['intensities']
-        width = processed_data['width']
-        num_lines = processed_data['num_lines']
-        image_array = processed_data['image_array']  # Get original image data
-        lines = processed_data['lines']  # Get line segments
+    def generate_sine_waves(self, processed):
+        """Generate sine wave data for all lines of a ProcessedImage"""
+        width = processed.width
+        num_lines = processed.num_lines
 
         logger.debug(f"Generating sine waves for {num_lines} lines, width={width}")
         logger.debug(f"Line height: {self.line_height}, Base amplitude: {self.base_amplitude}")
 
+        if self.wave_mode == 'batched':
+            sine_waves = list(self.iter_wave_rows(self.generate_wave_arrays(processed)))
+            logger.debug(f"Generated {len(sine_waves)} sine waves (batched)")
+            return sine_waves
+
         sine_waves = []
 
-        for line_idx, line_intensities in enumerate(intensities):
+        for line_idx in range(num_lines):
             base_y = line_idx * self.line_height + self.line_height / 2
-            line_segment = lines[line_idx]  # Get the actual image data for this line
-            wave_data = self._generate_varying_line_wave(line_intensities, width, base_y, line_idx, line_segment)
+            middle_row = processed.middle_rows[line_idx]  # Pixels at this line's baseline
+            wave_data = self._generate_varying_line_wave(processed.line_intensities(line_idx), width, base_y,
+                                                         line_idx, middle_row)
             logger.debug(f"Line {line_idx}: wave_data.len={len(wave_data)}")
 
             sine_waves.append(wave_data)
@@ -51,6 +85,21 @@ class SineGenerator:
         logger.debug(f"Generated {len(sine_waves)} sine waves")
         return sine_waves
     
+    def iter_sine_waves(self, processed):
+        """Generate sine wave data of a ProcessedImage lazily, one line at a time
+
+        Lets callers stream output while holding only a single line of wave
+        data in memory.
+        """
+        for line_idx in range(processed.num_lines):
+            base_y = line_idx * self.line_height + self.line_height / 2
+            line_intensities = processed.line_intensities(line_idx)
+            middle_row = processed.middle_rows[line_idx]
+            if self.wave_mode == 'batched':
+                yield self._generate_varying_line_wave_batch(line_intensities, processed.width, base_y, line_idx, middle_row)
+            else:
+                yield self._generate_varying_line_wave(line_intensities, processed.width, base_y, line_idx, middle_row)
+    
     def _generate_line_wave(self, line_intensities, width, base_y, line_idx=None):
         """Generate sine wave for a single line"""
         # Average intensity for the entire line (or use first row if needed)
@@ -84,7 +133,7 @@ class SineGenerator:
             'intensity': avg_intensity
         }
     
-    def _generate_varying_line_wave(self, column_intensities, width, base_y, line_idx=None, line_segment=None):
+    def _generate_varying_line_wave(self, column_intensities, width, base_y, line_idx=None, middle_row=None):
         """Generate sine wave with varying frequency based on column intensities and individual pixel widths"""
         # Each vertical column has its own intensity -> frequency
         # Each individual pixel has its own intensity -> width
@@ -116,13 +165,12 @@ class SineGenerator:
             frequency = self.frequency_mapper.get_frequency(intensity)
 
             # Calculate width based on individual pixel intensity
-            if line_segment is not None:
+            if middle_row is not None:
                 # Sample the pixel at the baseline (middle row of the line segment)
-                middle_row = line_segment.shape[0] // 2
-                pixel_intensity = line_segment[middle_row, col_idx]
+                pixel_intensity = middle_row[col_idx]
                 width_value = self.width_mapper.get_width(pixel_intensity)
             else:
-                # Fallback to column intensity if line_segment not available
+                # Fallback to column intensity if middle_row not available
                 width_value = self.width_mapper.get_width(intensity)
 
             widths[sample_idx] = width_value
@@ -151,7 +199,7 @@ class SineGenerator:
             amplitude = self.line_height * amplitude_factor
 
             # Handle zero frequency as a flat line
-            if frequency <= 0.001:  # Treat very small frequencies as zero
+            if frequency <= FLAT_FREQUENCY_THRESHOLD:  # Treat very small frequencies as zero
                 y_coords[sample_idx] = base_y
             else:
                 y_coords[sample_idx] = base_y + amplitude * np.sin(phase)
@@ -171,6 +219,133 @@ class SineGenerator:
             'column_count': len(column_intensities)
         }
 
+    def iter_line_waves(self, line_intensities, width, first_line=0):
+        """Generate wave data from (line_segment, column_intensities) pairs
+
+        Unlike iter_sine_waves this needs no ProcessedImage of the whole
+        image, so lines can be read, converted and written one at a time.
+        first_line is the index of the first pair's line in the image.
+        """
+        for line_idx, (line_segment, column_intensities) in enumerate(line_intensities, start=first_line):
+            base_y = line_idx * self.line_height + self.line_height / 2
+            middle_row = line_segment[line_segment.shape[0] // 2]
+            if self.wave_mode == 'batched':
+                yield self._generate_varying_line_wave_batch(column_intensities, width, base_y, line_idx, middle_row)
+            else:
+                yield self._generate_varying_line_wave(column_intensities, width, base_y, line_idx, middle_row)
+
+    def generate_wave_arrays(self, processed, include_widths=True):
+        """Generate wave data for all lines of a ProcessedImage at once as 2D arrays
+
+        Returns:
+            dict with shared 1D 'x_coords', 2D (num_lines x num_samples)
+            'y_coords', 'phase', 'frequencies' and 'amplitudes' (plus
+            'widths' unless include_widths is False), and 1D 'base_y'
+        """
+        x_coords, col_indices = self._sample_columns(processed.width)
+        base_y = np.arange(processed.num_lines) * self.line_height + self.line_height / 2
+
+        sample_intensities = processed.intensities_at(col_indices)
+        wave = self._synthesize(sample_intensities, x_coords, base_y[:, np.newaxis])
+        wave['x_coords'] = x_coords
+        wave['base_y'] = base_y
+
+        if include_widths:
+            wave['widths'] = self.generate_width_arrays(processed)
+
+        return wave
+
+    def generate_width_arrays(self, processed):
+        """Generate stroke widths for all lines as a 2D (num_lines x num_samples) array
+
+        Widths only depend on the image and the width range, so they can be
+        recomputed without redoing the wave synthesis.
+        """
+        _, col_indices = self._sample_columns(processed.width)
+
+        # Sample the pixel at the baseline (middle row) of every line segment
+        return self.width_mapper.get_widths_batch(processed.middle_rows[:, col_indices])
+
+    def iter_wave_rows(self, wave_arrays):
+        """Split 2D arrays from generate_wave_arrays into per-line wave data"""
+        x_coords = wave_arrays['x_coords']
+        for line_idx, base_y in enumerate(wave_arrays['base_y']):
+            yield self._wave_data(
+                x_coords,
+                {key: wave_arrays[key][line_idx] for key in LINE_ARRAY_KEYS},
+                wave_arrays['widths'][line_idx],
+                base_y,
+                len(x_coords) // self.samples_per_pixel
+            )
+
+    def _generate_varying_line_wave_batch(self, column_intensities, width, base_y, line_idx=None, middle_row=None):
+        """Vectorized equivalent of _generate_varying_line_wave for a single line"""
+        column_intensities = np.asarray(column_intensities, dtype=np.float64)
+        x_coords, col_indices = self._sample_columns(width)
+
+        sample_intensities = column_intensities[col_indices]
+        wave = self._synthesize(sample_intensities, x_coords, base_y)
+
+        if middle_row is not None:
+            # Sample the pixel at the baseline (middle row of the line segment)
+            widths = self.width_mapper.get_widths_batch(middle_row[col_indices])
+        else:
+            # Fallback to column intensity if middle_row not available
+            widths = self.width_mapper.get_widths_batch(sample_intensities)
+
+        if line_idx is not None and line_idx < 2:
+            logger.debug(f"Line {line_idx}: num_samples={len(x_coords)}, width={width} (batched)")
+
+        return self._wave_data(x_coords, wave, widths, base_y, len(column_intensities))
+
+    def _sample_columns(self, width):
+        """Sample x positions along the line and the image column of each sample"""
+        num_samples = width * self.samples_per_pixel
+        x_coords = np.linspace(0, width-1, num_samples)
+        col_indices = np.minimum(x_coords.astype(np.intp), width - 1)
+        return x_coords, col_indices
+
+    def _synthesize(self, sample_intensities, x_coords, base_y):
+        """Compute y coordinates and cumulative phase along the last axis
+
+        Phase is integrated with the trapezoidal rule over the per-sample
+        frequencies, matching the accumulation in _generate_varying_line_wave.
+        Returns a dict with 'y_coords', 'phase', 'frequencies' and 'amplitudes'.
+        """
+        frequencies = self.frequency_mapper.get_frequencies_batch(sample_intensities)
+        amplitudes = self.line_height * self.amplitude_mapper.get_amplitude_factors_batch(sample_intensities)
+
+        phase = np.zeros_like(frequencies)
+        if frequencies.shape[-1] > 1:
+            avg_frequencies = (frequencies[..., 1:] + frequencies[..., :-1]) / 2
+            np.cumsum(avg_frequencies * np.diff(x_coords), axis=-1, out=phase[..., 1:])
+
+        y_coords = base_y + amplitudes * np.sin(phase)
+        # Handle zero frequency as a flat line
+        flat = frequencies <= FLAT_FREQUENCY_THRESHOLD
+        y_coords = np.where(flat, base_y, y_coords)
+
+        return {
+            'y_coords': y_coords,
+            'phase': phase,
+            'frequencies': frequencies,
+            'amplitudes': amplitudes
+        }
+
+    def _wave_data(self, x_coords, wave, widths, base_y, column_count):
+        return {
+            'x_coords': x_coords,
+            'y_coords': wave['y_coords'],
+            'widths': widths,
+            'phase': wave['phase'],
+            'frequencies': wave['frequencies'],
+            'amplitudes': wave['amplitudes'],
+            'base_y': base_y,
+            'varying_frequencies': True,
+            'varying_widths': True,
+            'column_count': column_count
+        }
+
     # def generate_varying_sine_wave(self, line_intensities, width, base_y):
     #     """Legacy method - kept for compatibility"""
     #     return self._generate_varying_line_wave(line_intensities, width, base_y)
\ No newline at end of file
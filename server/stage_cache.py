@@ -0,0 +1,80 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Parameters each intermediate result depends on directly; the uploaded
+# image is the implicit input of every stage
+STAGE_PARAMETERS = {
+    'grayscale': ('target_width', 'target_lines'),
+    'intensity_index': (),
+    'waves': ('line_height', 'frequency_min', 'frequency_max', 'amplitude_min', 'amplitude_max', 'tone_curve'),
+    'widths': ('line_height', 'stroke_width_min', 'stroke_width_max', 'tone_curve'),
+}
+
+# Stages each stage is computed from; a stage is keyed by the parameters
+# of all its upstream stages too, so it is invalidated whenever they are
+STAGE_INPUTS = {
+    'grayscale': (),
+    'intensity_index': ('grayscale',),
+    'waves': ('intensity_index',),
+    'widths': ('grayscale',),
+}
+
+def stage_parameters(stage):
+    """Names of all parameters a stage depends on, directly or through its inputs"""
+    names = set(STAGE_PARAMETERS[stage])
+    for upstream in STAGE_INPUTS[stage]:
+        names |= stage_parameters(upstream)
+    return names
+
+class StageCache:
+    """Intermediate pipeline results of one upload, stored next to it on disk
+
+    Each stage is saved as an .npz file named after the stage and a hash of
+    the parameters it depends on, so a parameter change only invalidates the
+    stages downstream of the parameters that changed. Only the latest
+    result of each stage is kept.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, stage, params):
+        """Return the stored arrays of a stage for these parameters, or None"""
+        path = self._path(stage, params)
+        try:
+            with np.load(path) as stored:
+                arrays = {name: stored[name] for name in stored.files}
+        except FileNotFoundError:
+            return None
+        logger.debug(f"Reusing {stage} stage from {path}")
+        return arrays
+
+    def store(self, stage, params, arrays):
+        """Save the arrays of a stage, replacing results for older parameters"""
+        path = self._path(stage, params)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+        for name in os.listdir(self.directory):
+            if name.startswith(f"{stage}-") and name.endswith('.npz') and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def _path(self, stage, params):
+        parameters = {name: getattr(params, name) for name in stage_parameters(stage)}
+        if parameters.get('target_lines'):
+            # The decoded height is target_lines times the line height
+            parameters['line_height'] = params.line_height
+        digest = hashlib.sha256(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{stage}-{digest}.npz")
@@ -1,10 +1,34 @@
 import numpy as np
 from xml.dom import minidom
+from xml.sax.saxutils import escape
+from path_formatter import format_path_data, format_path_segments, format_cubic_path_data
+from bezier_fitter import BezierFitter
+from params import PATH_MODES
+from config.config import SVG_PATH_MODE
+
+PATH_FORMATS = ('bulk', 'reference')
+
+# Wave data needed to fit Bézier curves instead of polylines
+BEZIER_KEYS = ('phase', 'frequencies', 'amplitudes')
 
 class SVGGenerator:
-    def __init__(self, stroke_width=1, stroke_color="black"):
+    def __init__(self, stroke_width=1, stroke_color="black", path_format='bulk',
+                 path_mode=None, bezier_tolerance=None):
+        path_mode = path_mode or SVG_PATH_MODE
+        if path_format not in PATH_FORMATS:
+            raise ValueError(f"Unknown path format: {path_format}")
+        if path_mode not in PATH_MODES:
+            raise ValueError(f"Unknown path mode: {path_mode}")
         self.stroke_width = stroke_width
         self.stroke_color = stroke_color
+        self.path_format = path_format
+        self.path_mode = path_mode
+        self.bezier_fitter = BezierFitter(tolerance=bezier_tolerance)
+
+    @classmethod
+    def from_params(cls, params, **kwargs):
+        """Create a generator configured by a ConversionParams"""
+        return cls(path_mode=params.path_mode, bezier_tolerance=params.bezier_tolerance, **kwargs)
     
     def generate_svg(self, sine_waves, width, height):
         """Generate complete SVG from sine wave data"""
@@ -96,35 +120,64 @@ class SVGGenerator:
     
     def generate_optimized_svg(self, sine_waves, width, height):
         """Generate SVG with optimized path data for smaller file size"""
-        doc = minidom.Document()
-        svg = doc.createElement('svg')
-        svg.setAttribute('width', str(width))
-        svg.setAttribute('height', str(height))
-        svg.setAttribute('viewBox', f"0 0 {width} {height}")
-        svg.setAttribute('xmlns', 'http://www.w3.org/2000/svg')
-        doc.appendChild(svg)
+        return "".join(self.iter_optimized_svg(sine_waves, width, height))
+
+    def write_optimized_svg(self, sine_waves, width, height, out):
+        """Stream optimized SVG into a writable text file object"""
+        for chunk in self.iter_optimized_svg(sine_waves, width, height):
+            out.write(chunk)
+
+    def iter_optimized_svg(self, sine_waves, width, height):
+        """Serialize optimized SVG incrementally, one chunk per line
+
+        sine_waves may be any iterable (e.g. SineGenerator.iter_sine_waves),
+        so only one line of wave data and markup is held at a time. The
+        output is identical to what minidom's toprettyxml produced and the
+        generator can be passed directly to a streaming Flask Response.
+        """
+        return self.iter_svg_document((self.line_markup(wave_data) for wave_data in sine_waves), width, height)
+
+    def iter_svg_document(self, line_chunks, width, height):
+        """Wrap per-line markup from line_markup() into a complete SVG document"""
+        yield '<?xml version="1.0" ?>\n'
+        yield (f'<svg width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+               f'xmlns="http://www.w3.org/2000/svg">\n')
 
         # Create a single group for all paths
-        group = doc.createElement('g')
-        group.setAttribute('stroke', self.stroke_color)
-        group.setAttribute('fill', 'none')
         # Note: Don't set stroke-width here since we'll use variable widths
-        svg.appendChild(group)
+        group_attributes = f'stroke={_quote(self.stroke_color)} fill="none"'
+        group_open = False
 
-        # Add optimized paths with variable widths
-        for wave_data in sine_waves:
-            if 'widths' in wave_data and wave_data.get('varying_widths', False):
-                # Use variable width path creation
-                self._create_variable_width_paths(doc, wave_data, group)
-            else:
-                # Fallback to single path with default width
-                path = doc.createElement('path')
-                path.setAttribute('stroke-width', str(self.stroke_width))
-                path_data = self._generate_optimized_path_data(wave_data)
-                path.setAttribute('d', path_data)
-                group.appendChild(path)
-
-        return doc.toprettyxml(indent="  ")
+        for chunk in line_chunks:
+            if chunk and not group_open:
+                yield f'  <g {group_attributes}>\n'
+                group_open = True
+            yield chunk
+
+        if group_open:
+            yield '  </g>\n'
+        else:
+            yield f'  <g {group_attributes}/>\n'
+        yield '</svg>\n'
+
+    def line_markup(self, wave_data):
+        """Path elements for one line of wave data, as indented SVG markup"""
+        if self.path_mode == 'outline':
+            # One filled shape per line regardless of width variation
+            return self._create_outline_path(wave_data)
+        if 'widths' in wave_data and wave_data.get('varying_widths', False):
+            # Use variable width path creation
+            return "".join(self._create_variable_width_paths(wave_data))
+
+        # Fallback to single path with default width
+        path_data = self._generate_optimized_path_data(wave_data)
+        return self._path_element(path_data, str(self.stroke_width))
+
+    def _path_element(self, path_data, stroke_width=None):
+        """Serialize a single path element inside the optimized SVG group"""
+        if stroke_width is None:
+            return f'    <path d={_quote(path_data)}/>\n'
+        return f'    <path stroke-width={_quote(stroke_width)} d={_quote(path_data)}/>\n'
     
     def _generate_optimized_path_data(self, wave_data):
         """Generate optimized path data with fewer points"""
@@ -141,6 +194,12 @@ class SVGGenerator:
         if len(x_coords) == 0:
             return ""
 
+        if self._uses_bezier(wave_data):
+            return self._generate_bezier_path_data(wave_data)
+
+        if self.path_format == 'bulk':
+            return format_path_data(x_coords, y_coords)
+
         path_parts = [f"M{x_coords[0]:.1f},{y_coords[0]:.1f}"]
 
         for i in range(1, len(x_coords)):
@@ -148,23 +207,74 @@ class SVGGenerator:
 
         return " ".join(path_parts)
 
-    def _create_variable_width_paths(self, doc, wave_data, group):
+    def _create_outline_path(self, wave_data):
+        """Create a single filled path tracing both edges of a variable-width line"""
+        x_coords = np.asarray(wave_data['x_coords'], dtype=np.float64)
+        y_coords = np.asarray(wave_data['y_coords'], dtype=np.float64)
+
+        if len(x_coords) < 2:
+            return ""
+
+        if len(wave_data.get('widths', [])) > 0:
+            half_widths = np.asarray(wave_data['widths'], dtype=np.float64) / 2
+        else:
+            half_widths = np.full(len(x_coords), self.stroke_width / 2)
+
+        # Offset every point along the unit normal of the curve
+        tangent_x = np.gradient(x_coords)
+        tangent_y = np.gradient(y_coords)
+        tangent_length = np.hypot(tangent_x, tangent_y)
+        tangent_length[tangent_length == 0] = 1.0
+        offset_x = -tangent_y / tangent_length * half_widths
+        offset_y = tangent_x / tangent_length * half_widths
+
+        # Upper edge left to right, then lower edge back right to left
+        outline_x = np.concatenate([x_coords + offset_x, (x_coords - offset_x)[::-1]])
+        outline_y = np.concatenate([y_coords + offset_y, (y_coords - offset_y)[::-1]])
+        path_data = format_path_data(outline_x, outline_y) + " Z"
+
+        color = _quote(self.stroke_color)
+        return f'    <path fill={color} stroke="none" d={_quote(path_data)}/>\n'
+
+    def _generate_bezier_path_data(self, wave_data, start=0, end=None):
+        """Generate path data of cubic Bézier curves fitted to the wave"""
+        start_point, controls = self.bezier_fitter.fit(wave_data, start, end)
+        return format_cubic_path_data(start_point, controls, self.bezier_fitter.decimals)
+
+    def _uses_bezier(self, wave_data):
+        """Bézier output needs the phase data only batched synthesis provides"""
+        return self.path_mode == 'bezier' and all(key in wave_data for key in BEZIER_KEYS)
+
+    def _create_variable_width_paths(self, wave_data):
         """Create multiple path segments with different stroke widths"""
         x_coords = wave_data['x_coords']
         y_coords = wave_data['y_coords']
         widths = wave_data.get('widths', [])
+        paths = []
 
         if len(widths) == 0:
             # Fallback to single path if no width data
-            path = doc.createElement('path')
             path_data = self._generate_optimized_path_data(wave_data)
-            path.setAttribute('d', path_data)
-            group.appendChild(path)
-            return
+            paths.append(self._path_element(path_data))
+            return paths
 
         # Group consecutive points with similar widths
         width_threshold = 0.1  # Minimum width difference to create new segment
 
+        if self._uses_bezier(wave_data):
+            for start, end, segment_width in _width_segments(widths, width_threshold):
+                path_data = self._generate_bezier_path_data(wave_data, start, end)
+                paths.append(self._path_element(path_data, f"{segment_width:.2f}"))
+            return paths
+
+        if self.path_format == 'bulk':
+            segments = _width_segments(widths, width_threshold)
+            bounds = [(start, end) for start, end, _ in segments]
+            path_datas = format_path_segments(x_coords, y_coords, bounds)
+            for (_, _, segment_width), path_data in zip(segments, path_datas):
+                paths.append(self._path_element(path_data, f"{segment_width:.2f}"))
+            return paths
+
         current_width = widths[0]
         segment_start = 0
 
@@ -174,9 +284,6 @@ class SVGGenerator:
                 end_idx = i if i == len(widths) - 1 else i
 
                 if end_idx > segment_start:
-                    path = doc.createElement('path')
-                    path.setAttribute('stroke-width', f"{current_width:.2f}")
-
                     # Create path data for this segment
                     segment_x = x_coords[segment_start:end_idx + 1]
                     segment_y = y_coords[segment_start:end_idx + 1]
@@ -186,9 +293,50 @@ class SVGGenerator:
                         for j in range(1, len(segment_x)):
                             path_parts.append(f"L{segment_x[j]:.1f},{segment_y[j]:.1f}")
 
-                        path.setAttribute('d', " ".join(path_parts))
-                        group.appendChild(path)
+                        paths.append(self._path_element(" ".join(path_parts), f"{current_width:.2f}"))
 
                 # Start new segment
                 current_width = widths[i]
-                segment_start = i
\ No newline at end of file
+                segment_start = i
+
+        return paths
+
+
+def _width_segments(widths, threshold):
+    """Find runs of samples whose width stays within threshold of the run start
+
+    Mirrors the grouping loop in _create_variable_width_paths: each run
+    starts where the previous one ended and closes at the first sample that
+    differs from the run's starting width by more than threshold (or at the
+    last sample). Returns (start, end, width) tuples with end inclusive.
+    """
+    widths = np.asarray(widths, dtype=np.float64)
+    last = len(widths) - 1
+    segments = []
+    start = 0
+
+    while start < last:
+        current_width = widths[start]
+        end = last
+        lo = start + 1
+        window = 16
+
+        # Scan ahead in growing windows so long runs cost a few array ops
+        while lo < last:
+            hi = min(lo + window, last)
+            changes = np.flatnonzero(np.abs(widths[lo:hi] - current_width) > threshold)
+            if len(changes) > 0:
+                end = lo + changes[0]
+                break
+            lo = hi
+            window *= 2
+
+        segments.append((start, end, current_width))
+        start = end
+
+    return segments
+
+
+def _quote(value):
+    """Quote an attribute value the way minidom serializes it"""
+    return '"' + escape(str(value), {'"': '&quot;'}) + '"'
@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import uuid
+import itertools
+import logging
+from dataclasses import fields
+from PIL import Image, ImageDraw, ImageFont
+from params import ConversionParams
+from image_processor import ImageProcessor
+from pipeline import build_generators, write_svg
+from preview import render_waves
+from parallel_lines import get_executor
+from config.config import SWEEP_PREVIEW_WIDTH, SWEEP_TILE_SIZE, SWEEP_MAX_VARIANTS, SWEEP_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Decided by the sweep's preview width, so every variant shares one decode
+FIXED_PARAMETERS = ('target_width', 'target_lines')
+
+# Contact sheet layout in pixels
+SHEET_PADDING = 8
+CAPTION_LINE_HEIGHT = 12
+
+def expand_grid(grid):
+    """Every combination of a {name: [values, ...]} grid, as a list of override dicts
+
+    Raises:
+        ValueError: if the grid is malformed or has more than SWEEP_MAX_VARIANTS combinations
+    """
+    if not isinstance(grid, dict) or not grid:
+        raise ValueError("grid must be a non-empty object of parameter value lists")
+    for name, values in grid.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"grid values of {name} must be a non-empty list")
+    # Checked before expanding, as a large grid would not fit in memory
+    count = math.prod(len(values) for values in grid.values())
+    if count > SWEEP_MAX_VARIANTS:
+        raise ValueError(f"Too many parameter sets ({count}); the limit is {SWEEP_MAX_VARIANTS}")
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+class Sweep:
+    """Preview conversions of one uploaded image for many parameter sets
+
+    The image is decoded once, downscaled to preview_width, and its
+    intensities are computed once per line height; only the waves and
+    SVGs differ per set. Every variant is written as a small SVG and drawn
+    on a contact sheet captioned with its overrides.
+    """
+
+    def __init__(self, upload_dir, file_id, base_params, overrides, preview_width=None, tile_size=None):
+        if not overrides:
+            raise ValueError("A sweep needs at least one parameter set")
+        if len(overrides) > SWEEP_MAX_VARIANTS:
+            raise ValueError(f"Too many parameter sets ({len(overrides)}); the limit is {SWEEP_MAX_VARIANTS}")
+        names = {field.name for field in fields(ConversionParams)}
+        for override in overrides:
+            for name in override:
+                if name not in names:
+                    raise ValueError(f"Unknown parameter: {name}")
+                if name in FIXED_PARAMETERS:
+                    raise ValueError(f"{name} cannot be swept; set preview_width instead")
+
+        self.preview_width = SWEEP_PREVIEW_WIDTH if preview_width is None else preview_width
+        self.tile_size = tile_size or SWEEP_TILE_SIZE
+        if self.preview_width < 0 or not 16 <= self.tile_size <= 2048:
+            raise ValueError(f"Invalid preview size: width {self.preview_width}, tile {self.tile_size}")
+
+        base_params = base_params.with_overrides({'target_width': self.preview_width, 'target_lines': 0})
+        self.param_sets = [base_params.with_overrides(override) for override in overrides]
+        self.overrides = overrides
+        self.file_id = file_id
+        self.id = str(uuid.uuid4())
+        self.directory = os.path.join(upload_dir, f"sweep-{self.id}")
+        os.makedirs(self.directory, exist_ok=True)
+
+    @property
+    def job_id(self):
+        return f"sweep-{self.id}"
+
+    @property
+    def sheet_path(self):
+        return os.path.join(self.directory, 'sheet.png')
+
+    def svg_path(self, index):
+        return os.path.join(self.directory, f"{index}.svg")
+
+    def outputs(self):
+        """(svg_path, params) for every parameter set"""
+        return [(self.svg_path(index), params) for index, params in enumerate(self.param_sets)]
+
+    def labels(self):
+        """Contact sheet caption of every variant, one "name=value" per line"""
+        return [[f"{name}={value}" for name, value in override.items()] for override in self.overrides]
+
+    def report(self, status):
+        """Per-variant results and links, given the JobQueue status of the sweep's job"""
+        status = status or {'status': 'unknown'}
+        results = status.get('variants') or [{} for _ in self.param_sets]
+        variants = []
+        for index, (override, result) in enumerate(zip(self.overrides, results)):
+            variant = {'index': index, 'overrides': override, 'svg': f"/sweep/{self.id}/{index}.svg"}
+            variant.update(result)
+            variants.append(variant)
+
+        return {
+            'id': self.id,
+            'file_id': self.file_id,
+            'status': status['status'],
+            'preview_width': self.preview_width,
+            'sheet': f"/sweep/{self.id}/sheet.png",
+            'timings': status.get('timings'),
+            'error': status.get('error'),
+            'variants': variants
+        }
+
+
+def run_sweep(image_path, outputs, sheet_path, labels, tile_size, progress=None):
+    """Job function: convert an image with every parameter set from one decode and intensity pass
+
+    The parameter sets must share their target size. Variants are rendered
+    on SWEEP_WORKERS worker processes, or in this process if that is 1. A
+    failing set is reported in its result and does not stop the others.
+
+    Returns:
+        dict with one result per output in 'variants', and the seconds the
+        shared decode and intensity pass took in 'shared_seconds'
+    """
+    start = time.perf_counter()
+    image_processor = ImageProcessor.from_params(outputs[0][1])
+    image_array = image_processor.load_image(image_path)
+
+    # One summed-area table gives the intensities for any line height
+    index = image_processor.build_intensity_index(image_array)
+    processed = {}
+    for _, params in outputs:
+        if params.line_height not in processed:
+            processed[params.line_height] = ImageProcessor(line_height=params.line_height).process_array(image_array, index)
+    shared_seconds = time.perf_counter() - start
+
+    tasks = [(processed[params.line_height], params, svg_path, tile_size) for svg_path, params in outputs]
+    if SWEEP_WORKERS > 1 and len(tasks) > 1:
+        executor = get_executor(SWEEP_WORKERS)
+        rendered = (future.result() for future in [executor.submit(_render_variant, *task) for task in tasks])
+    else:
+        rendered = (_render_variant(*task) for task in tasks)
+
+    results, tiles = [], []
+    for result, tile in rendered:
+        results.append(result)
+        tiles.append(tile)
+        if progress is not None:
+            progress(len(results), len(tasks))
+
+    contact_sheet(tiles, labels, tile_size).save(sheet_path)
+    logger.debug(f"Swept {len(outputs)} parameter sets over {image_path}")
+    return {'variants': results, 'shared_seconds': round(shared_seconds, 3)}
+
+def contact_sheet(tiles, labels, tile_size):
+    """Arrange tiles in a grid with their caption lines below each one; None tiles are marked as failed"""
+    columns = math.ceil(math.sqrt(len(tiles)))
+    rows = math.ceil(len(tiles) / columns)
+    caption_height = CAPTION_LINE_HEIGHT * max((len(label) for label in labels), default=0)
+    cell_width = tile_size + 2 * SHEET_PADDING
+    cell_height = tile_size + caption_height + 2 * SHEET_PADDING
+
+    sheet = Image.new('L', (columns * cell_width, rows * cell_height), 255)
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default()
+    for position, (tile, label) in enumerate(zip(tiles, labels)):
+        left = (position % columns) * cell_width + SHEET_PADDING
+        top = (position // columns) * cell_height + SHEET_PADDING
+        if tile is None:
+            draw.text((left, top), "failed", fill=0, font=font)
+        else:
+            sheet.paste(tile, (left + (tile_size - tile.width) // 2, top + (tile_size - tile.height) // 2))
+        for line_idx, text in enumerate(label):
+            draw.text((left, top + tile_size + line_idx * CAPTION_LINE_HEIGHT), text, fill=0, font=font)
+    return sheet
+
+def _render_variant(processed, params, svg_path, tile_size):
+    """Waves, SVG and contact sheet tile of one parameter set; runs in sweep workers"""
+    start = time.perf_counter()
+    try:
+        _, sine_generator, svg_generator = build_generators(params)
+        width, height = processed.width, processed.height
+        # Small at preview sizes, and needed twice
+        sine_waves = list(sine_generator.iter_sine_waves(processed))
+        result = write_svg(svg_generator, sine_waves, width, height, svg_path)
+        result.update({'width': width, 'height': height, 'num_lines': processed.num_lines})
+        tile = render_waves(sine_waves, width, height, tile_size)
+    except Exception as e:
+        logger.error(f"Sweep variant {svg_path} failed: {e}")
+        result, tile = {'error': str(e)}, None
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result, tile
@@ -0,0 +1,47 @@
+import re
+import numpy as np
+import pytest
+from image_processor import ImageProcessor
+from sine_generator import SineGenerator
+from svg_generator import SVGGenerator
+from bezier_fitter import _WaveModel
+
+def _test_image():
+    """Gradient with noise and a hard edge, so the wave has every kind of bend"""
+    rng = np.random.default_rng(7)
+    gradient = np.tile(np.linspace(0, 255, 160), (48, 1))
+    image = gradient + rng.normal(0, 40, gradient.shape)
+    image[:, 70:90] = 0
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+def _parse_cubic_path(path_data):
+    """Absolute (start, c1, c2, end) points of every segment of "M... c..." path data"""
+    numbers = [float(v) for v in re.findall(r'-?\d+(?:\.\d+)?', path_data)]
+    current = np.array(numbers[:2])
+    segments = []
+    for i in range(2, len(numbers), 6):
+        c1, c2, end = (current + np.array(numbers[i + j:i + j + 2]) for j in (0, 2, 4))
+        segments.append((current, c1, c2, end))
+        current = end
+    return segments
+
+def _max_deviation(path_data, wave_data):
+    """Largest vertical distance between the written curves and the wave they approximate"""
+    model = _WaveModel(wave_data, 0, None)
+    t = np.linspace(0, 1, 201)[:, np.newaxis]
+    deviation = 0.0
+    for p0, p1, p2, p3 in _parse_cubic_path(path_data):
+        points = ((1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1
+                  + 3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3)
+        wave_y, _ = model.evaluate(points[:, 0])
+        deviation = max(deviation, np.abs(points[:, 1] - wave_y).max())
+    return deviation
+
+@pytest.mark.parametrize('tolerance', [0.5, 0.1, 0.02, 0.005])
+@pytest.mark.parametrize('line_height', [4, 12])
+def test_bezier_paths_stay_within_tolerance(tolerance, line_height):
+    processed = ImageProcessor(line_height=line_height).process_array(_test_image())
+    svg_generator = SVGGenerator(path_mode='bezier', bezier_tolerance=tolerance)
+    for wave_data in SineGenerator(line_height=line_height).iter_sine_waves(processed):
+        path_data = svg_generator._generate_bezier_path_data(wave_data)
+        assert _max_deviation(path_data, wave_data) <= tolerance
@@ -0,0 +1,137 @@
+import os
+import json
+import math
+import uuid
+import shutil
+import hashlib
+import logging
+import numpy as np
+from PIL import Image, ImageDraw
+from config.config import TILE_SIZE, TILE_SUPERSAMPLING, TILE_OVERZOOM
+
+logger = logging.getLogger(__name__)
+
+class TilePyramid:
+    """Zoom levels of PNG tiles rasterized from a WaveStore
+
+    Level native_level draws the waves at the SVG's own scale; every level
+    below halves the scale down to level 0, whose single tile holds the
+    whole image, and TILE_OVERZOOM levels above double it for close-ups.
+    Tiles are drawn on first request, anti-aliased by drawing them
+    TILE_SUPERSAMPLING times larger and box-filtering them down, and kept
+    as PNG files in a directory named after the wave parameters, so tile
+    URLs change whenever the waves do.
+    """
+
+    def __init__(self, store, cache_dir, tile_size=None):
+        self.store = store
+        self.tile_size = tile_size or TILE_SIZE
+        self.key = hashlib.sha256(json.dumps(store.params, sort_keys=True).encode()).hexdigest()[:16]
+        self.cache_dir = cache_dir
+        self.directory = os.path.join(cache_dir, self.key)
+        longest = max(store.width, store.height, 1)
+        self.native_level = max(0, math.ceil(math.log2(longest / self.tile_size)))
+        self.max_level = self.native_level + TILE_OVERZOOM
+
+        # Farthest a line's ink reaches from its baseline
+        params = store.params
+        self.margin = params['line_height'] * params['amplitude_max'] + params['stroke_width_max'] / 2 + 1
+
+    def info(self):
+        return {
+            'width': self.store.width,
+            'height': self.store.height,
+            'tile_size': self.tile_size,
+            'native_level': self.native_level,
+            'max_level': self.max_level,
+            'key': self.key
+        }
+
+    def scale(self, level):
+        return 2.0 ** (level - self.native_level)
+
+    def level_size(self, level):
+        scale = self.scale(level)
+        return math.ceil(self.store.width * scale), math.ceil(self.store.height * scale)
+
+    def tile_path(self, level, x, y):
+        """Path of a tile's PNG, drawn and cached if needed; None if out of range"""
+        if not 0 <= level <= self.max_level:
+            return None
+        level_width, level_height = self.level_size(level)
+        if not (0 <= x < math.ceil(level_width / self.tile_size) and 0 <= y < math.ceil(level_height / self.tile_size)):
+            return None
+
+        path = os.path.join(self.directory, str(level), f"{x}-{y}.png")
+        if os.path.exists(path):
+            return path
+
+        if not os.path.isdir(self.directory):
+            self._remove_stale()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.render_tile(level, x, y).save(tmp_path, 'PNG')
+        os.replace(tmp_path, path)
+        return path
+
+    def render_tile(self, level, x, y):
+        """Draw one tile as a grayscale PIL image, cropped at the image edges"""
+        scale = self.scale(level)
+        level_width, level_height = self.level_size(level)
+        left, top = x * self.tile_size, y * self.tile_size
+        width = min(self.tile_size, level_width - left)
+        height = min(self.tile_size, level_height - top)
+
+        supersampling = TILE_SUPERSAMPLING
+        canvas = Image.new('L', (width * supersampling, height * supersampling), 255)
+        draw = ImageDraw.Draw(canvas)
+        pixel_scale = scale * supersampling
+
+        # The tile's extent in image coordinates, widened by the ink margin
+        x0, x1 = (left / scale) - self.margin, ((left + width) / scale) + self.margin
+        y0, y1 = (top / scale) - self.margin, ((top + height) / scale) + self.margin
+        first_line, end_line = np.searchsorted(self.store.base_y, [y0, y1])
+
+        # Below one sample per drawn pixel, skip samples
+        step = max(1, int(1 / pixel_scale))
+        for line_idx in range(first_line, end_line):
+            wave_data = self.store.line(line_idx)
+            x_coords = wave_data['x_coords']
+            start, end = np.searchsorted(x_coords, [x0, x1])
+            # One point beyond each side keeps segments that cross the edge
+            start, end = max(0, start - 1), min(len(x_coords), end + 1)
+            if end - start < 2:
+                continue
+
+            indices = np.arange(start, end, step)
+            if indices[-1] != end - 1:
+                indices = np.append(indices, end - 1)
+            xs = (x_coords[indices] * scale - left) * supersampling
+            ys = (wave_data['y_coords'][indices] * scale - top) * supersampling
+            stroke_widths = np.maximum(1, np.rint(wave_data['widths'][indices] * pixel_scale)).astype(int)
+            _draw_polyline(draw, xs, ys, stroke_widths)
+
+        if supersampling > 1:
+            canvas = canvas.reduce(supersampling)
+        return canvas
+
+    def _remove_stale(self):
+        """Drop tiles drawn from earlier wave data"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name != self.key:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+
+def _draw_polyline(draw, xs, ys, stroke_widths):
+    """Draw a polyline as runs of equal stroke width, each joined to the next"""
+    points = np.column_stack([xs, ys])
+    changes = np.flatnonzero(np.diff(stroke_widths)) + 1
+    starts = np.concatenate([[0], changes])
+    ends = np.append(changes, len(points) - 1)
+    for start, end in zip(starts, ends):
+        stroke_width = int(stroke_widths[start])
+        run = points[start:end + 1].ravel().tolist()
+        if len(run) >= 4:
+            draw.line(run, fill=0, width=stroke_width, joint='curve' if stroke_width > 2 else None)
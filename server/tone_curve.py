@@ -0,0 +1,72 @@
+import numpy as np
+from params import parse_tone_curve
+
+# Mapper lookup tables hold one entry per 8-bit intensity
+LUT_SIZE = 256
+LUT_INPUTS = np.arange(LUT_SIZE, dtype=np.float64)
+
+class ToneCurve:
+    """Response curve applied to intensities before they are mapped to wave parameters
+
+    The curve maps normalized intensity (0 black, 1 white) onto 0..1 and
+    is written as a short spec, so it can be a conversion parameter:
+
+        linear                          intensities as they are
+        gamma:2.2                       n ** 2.2; above 1 darkens the midtones
+        scurve:4                        more contrast around mid-gray, the more the larger the value
+        piecewise:0/0,128/64,255/255    straight segments through input/output points in 0..255
+    """
+
+    def __init__(self, spec='linear'):
+        self.spec = spec
+        self.kind, values = parse_tone_curve(spec)
+        if self.kind == 'gamma' or self.kind == 'scurve':
+            self.value = values[0]
+        elif self.kind == 'piecewise':
+            self.inputs, self.outputs = np.array(values, dtype=np.float64).T / 255.0
+
+    @property
+    def is_linear(self):
+        return self.kind == 'linear'
+
+    def __call__(self, normalized):
+        """Apply the curve to normalized intensities"""
+        normalized = np.asarray(normalized, dtype=np.float64)
+        if self.kind == 'gamma':
+            return normalized ** self.value
+        if self.kind == 'scurve':
+            # Scaled so that 0, 0.5 and 1 stay where they are
+            return 0.5 + 0.5 * np.tanh(self.value * (normalized - 0.5)) / np.tanh(self.value / 2)
+        if self.kind == 'piecewise':
+            return np.interp(normalized, self.inputs, self.outputs)
+        return normalized
+
+
+class IntensityLUT:
+    """256-entry lookup table of a mapping from normalized intensity to a wave parameter
+
+    The tone curve is built into the table, so any curve costs the same
+    per sample. 8-bit pixels index the table directly; other intensities,
+    such as column means, are clamped to 0..255 and interpolated between
+    the two nearest entries. Under a linear curve that interpolation equals
+    the mapping itself, which numpy evaluates faster than the table, so
+    fractional intensities go straight to the mapping then.
+    """
+
+    def __init__(self, mapping, curve=None):
+        self.mapping = mapping
+        self.curve = curve if curve is not None and not curve.is_linear else None
+        normalized = LUT_INPUTS / 255.0
+        self.table = mapping(self.curve(normalized) if self.curve is not None else normalized)
+        self.slopes = np.diff(self.table)
+
+    def __call__(self, intensities):
+        intensities = np.asarray(intensities)
+        if intensities.dtype == np.uint8:
+            return self.table[intensities]
+
+        intensities = np.clip(intensities, 0, 255)
+        if self.curve is None:
+            return self.mapping(intensities / 255.0)
+        lower = np.minimum(intensities.astype(np.intp), LUT_SIZE - 2)
+        return self.table[lower] + (intensities - lower) * self.slopes[lower]
@@ -0,0 +1,180 @@
+import os
+import json
+import uuid
+import shutil
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of stored arrays changes
+WAVE_STORE_VERSION = 2
+
+# Per-sample arrays, one row of samples per line; the Bézier fitter's
+# arrays are only kept for stores made in the bezier path mode
+SAMPLE_ARRAYS = ('y_coords', 'widths')
+BEZIER_ARRAYS = ('phase', 'frequencies', 'amplitudes')
+SAMPLE_DTYPE = np.dtype('<f4')
+
+# Parameters the stored wave data depends on; the SVG-only path mode and
+# Bézier tolerance can change without invalidating a store
+WAVE_PARAMETERS = ('line_height', 'frequency_min', 'frequency_max', 'amplitude_min', 'amplitude_max',
+                   'stroke_width_min', 'stroke_width_max', 'target_width', 'target_lines', 'tone_curve')
+
+class WaveStore:
+    """Wave data of a conversion, memory-mapped from a directory of .npy files
+
+    Every line is sampled at the same x coordinates, which are stored once.
+    Each per-sample array holds the float32 samples of line i in row i, so
+    lines are read as views into the mapped files without copying. The
+    phase, frequencies and amplitudes only the Bézier fitter needs are
+    left out unless the conversion was made in the bezier path mode, which
+    keeps the store at a third of the size of the float64 wave data.
+    Exporters can format SVGs or render previews from it without redoing
+    the wave synthesis.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('version') != WAVE_STORE_VERSION:
+            raise ValueError(f"Unsupported wave store version: {meta.get('version')}")
+        self.width = meta['width']
+        self.height = meta['height']
+        self.params = meta['params']
+        self.has_bezier = meta['bezier']
+        self.x_coords = np.load(os.path.join(path, 'x_coords.npy'))
+        self.base_y = np.load(os.path.join(path, 'base_y.npy'))
+        names = SAMPLE_ARRAYS + BEZIER_ARRAYS if self.has_bezier else SAMPLE_ARRAYS
+        self.arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in names}
+
+    @property
+    def num_lines(self):
+        return len(self.base_y)
+
+    @property
+    def nbytes(self):
+        return self.x_coords.nbytes + sum(array.nbytes for array in self.arrays.values())
+
+    def matches(self, params):
+        """True if the stored waves were made with the wave parameters of params
+
+        Conversions in the bezier path mode also need the Bézier arrays.
+        """
+        return (self.params == wave_parameters(params)
+                and (self.has_bezier or params.path_mode != 'bezier'))
+
+    def line(self, line_idx):
+        """Wave data of one line, in the form SineGenerator produces it"""
+        wave_data = {name: array[line_idx] for name, array in self.arrays.items()}
+        wave_data.update({
+            'x_coords': self.x_coords,
+            'base_y': float(self.base_y[line_idx]),
+            'varying_frequencies': True,
+            'varying_widths': True,
+            'column_count': self.width
+        })
+        return wave_data
+
+    def iter_waves(self):
+        for line_idx in range(self.num_lines):
+            yield self.line(line_idx)
+
+
+class WaveStoreWriter:
+    """Writes wave data to a WaveStore one line at a time
+
+    Samples are appended to the .npy files as lines arrive, and the array
+    headers are filled in when the writer is closed. The store is built in
+    a temporary directory and swapped in only once it is complete. The
+    Bézier arrays are written if params is in the bezier path mode.
+    """
+
+    def __init__(self, path, width, height, params):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.params = wave_parameters(params)
+        self.bezier = params.path_mode == 'bezier'
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(self._tmp_path)
+        names = SAMPLE_ARRAYS + BEZIER_ARRAYS if self.bezier else SAMPLE_ARRAYS
+        self._files = {name: open(os.path.join(self._tmp_path, f"{name}.npy"), 'wb') for name in names}
+        self._x_coords = None
+        self._base_y = []
+
+    def add(self, wave_data):
+        """Append the samples of the next line"""
+        if self._x_coords is None:
+            self._x_coords = np.array(wave_data['x_coords'], dtype=np.float64)
+            for f in self._files.values():
+                _write_header(f, (0, len(self._x_coords)))
+        elif len(wave_data['x_coords']) != len(self._x_coords):
+            raise ValueError("All lines of a wave store must have the same number of samples")
+        for name, f in self._files.items():
+            f.write(np.ascontiguousarray(wave_data[name], dtype=SAMPLE_DTYPE).tobytes())
+        self._base_y.append(wave_data['base_y'])
+
+    def tee(self, sine_waves):
+        """Pass wave data through, adding every line to the store"""
+        for wave_data in sine_waves:
+            self.add(wave_data)
+            yield wave_data
+
+    def close(self):
+        """Finish the arrays and replace any store at path with this one"""
+        x_coords = self._x_coords if self._x_coords is not None else np.zeros(0)
+        for f in self._files.values():
+            f.seek(0)
+            _write_header(f, (len(self._base_y), len(x_coords)))
+            f.close()
+        np.save(os.path.join(self._tmp_path, 'x_coords.npy'), x_coords)
+        np.save(os.path.join(self._tmp_path, 'base_y.npy'), np.array(self._base_y, dtype=np.float64))
+        with open(os.path.join(self._tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'version': WAVE_STORE_VERSION, 'width': self.width, 'height': self.height,
+                       'params': self.params, 'bezier': self.bezier}, f)
+
+        # A directory cannot be renamed over another, so move the old one aside
+        old_path = f"{self.path}.{uuid.uuid4().hex}.old"
+        if os.path.exists(self.path):
+            os.replace(self.path, old_path)
+        os.replace(self._tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        logger.debug(f"Stored {len(self._base_y)} lines of wave data in {self.path}")
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def wave_parameters(params):
+    return {name: getattr(params, name) for name in WAVE_PARAMETERS}
+
+def open_wave_store(path, params=None):
+    """The WaveStore at path, or None if there is none or it was made with other wave parameters"""
+    try:
+        store = WaveStore(path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if params is not None and not store.matches(params):
+        return None
+    return store
+
+def _write_header(f, shape):
+    # numpy pads headers so the first dimension can grow without changing
+    # their size, which lets the final header overwrite the placeholder in
+    # place
+    header = {'descr': np.lib.format.dtype_to_descr(SAMPLE_DTYPE), 'fortran_order': False,
+              'shape': shape}
+    np.lib.format.write_array_header_1_0(f, header)
@@ -1,11 +1,19 @@
-import numpy as np
+from tone_curve import IntensityLUT
 
 class WidthMapper:
-    """Maps pixel intensity values to line width values"""
+    """Maps pixel intensity values to line width values through a 256-entry lookup table"""
 
-    def __init__(self, width_min, width_max):
+    def __init__(self, width_min, width_max, curve=None):
         self.width_min = width_min
         self.width_max = width_max
+        self.lut = IntensityLUT(self._map, curve)
+
+    def _map(self, normalized_intensities):
+        # Invert: bright pixels (high intensity) get thin lines
+        inverted_intensities = 1.0 - normalized_intensities
+
+        # Linear interpolation between width_min and width_max
+        return self.width_min + (inverted_intensities * (self.width_max - self.width_min))
 
     def get_width(self, pixel_intensity):
         """
@@ -13,13 +21,8 @@ class WidthMapper:
         - Higher intensity (bright pixels) -> smaller width (width_min)
         - Lower intensity (dark pixels) -> larger width (width_max)
         """
-        # Normalize intensity from 0-255 to 0-1
-        normalized_intensity = pixel_intensity / 255.0
-
-        # Invert: bright pixels (high intensity) get thin lines
-        inverted_intensity = 1.0 - normalized_intensity
-
-        # Linear interpolation between width_min and width_max
-        width = self.width_min + (inverted_intensity * (self.width_max - self.width_min))
+        return self.lut(pixel_intensity)
 
-        return width
\ No newline at end of file
+    def get_widths_batch(self, pixel_intensities):
+        """Map multiple pixel intensities to line widths with one table lookup"""
+        return self.lut(pixel_intensities)
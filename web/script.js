@@ -18,6 +18,7 @@ class ImageWaveApp {
         this.linesCount = document.getElementById('linesCount');
         this.downloadBtn = document.getElementById('downloadSvg');
         this.saveSvgBtn = document.getElementById('saveSvg');
+        this.saveSvgzBtn = document.getElementById('saveSvgz');
 
         // Configuration elements
         this.toggleConfigBtn = document.getElementById('toggleConfig');
@@ -28,7 +29,12 @@ class ImageWaveApp {
         this.amplitudeMaxInput = document.getElementById('amplitudeMax');
         this.widthMinInput = document.getElementById('widthMin');
         this.widthMaxInput = document.getElementById('widthMax');
+        this.toneCurveInput = document.getElementById('toneCurve');
         this.lineHeightInput = document.getElementById('lineHeight');
+        this.pathModeInput = document.getElementById('pathMode');
+        this.bezierToleranceInput = document.getElementById('bezierTolerance');
+        this.targetWidthInput = document.getElementById('targetWidth');
+        this.targetLinesInput = document.getElementById('targetLines');
         this.updateConfigBtn = document.getElementById('updateConfig');
         this.resetConfigBtn = document.getElementById('resetConfig');
         this.statusLine = document.getElementById('statusLine');
@@ -41,7 +47,12 @@ class ImageWaveApp {
             amplitude_max: 0.48,
             stroke_width_min: 1.0,
             stroke_width_max: 1.0,
-            line_height: 4
+            tone_curve: 'linear',
+            line_height: 4,
+            path_mode: 'polyline',
+            bezier_tolerance: 0.1,
+            target_width: 0,
+            target_lines: 0
         };
     }
 
@@ -107,6 +118,13 @@ class ImageWaveApp {
             }
         });
 
+        // Save SVGZ button (gzip-compressed download)
+        this.saveSvgzBtn.addEventListener('click', () => {
+            if (this.currentData && this.currentData.id) {
+                window.open(`/download/${this.currentData.id}?format=svgz`, '_blank');
+            }
+        });
+
         // Configuration events
         this.toggleConfigBtn.addEventListener('click', () => {
             this.toggleConfigPanel();
@@ -156,8 +174,10 @@ class ImageWaveApp {
                 throw new Error(data.error);
             }
 
-            this.currentData = data;
-            this.displayResults(data);
+            // Conversion runs in the background; wait for the job to finish
+            const result = await this.waitForConversion(data.id);
+            this.currentData = { ...data, ...result };
+            this.displayResults(this.currentData);
 
         } catch (error) {
             console.error('Upload error:', error);
@@ -167,6 +187,34 @@ class ImageWaveApp {
         }
     }
 
+    async waitForConversion(fileId) {
+        // Poll the job status until the conversion is done or has failed
+        while (true) {
+            const response = await fetch(`/convert/${fileId}`);
+            const status = await response.json();
+
+            if (!response.ok) {
+                throw new Error(status.error || 'Conversion status unavailable');
+            }
+            if (status.status === 'done') {
+                return status;
+            }
+            if (status.status === 'failed') {
+                throw new Error(status.error || 'Conversion failed');
+            }
+
+            const { lines_done, num_lines } = status.progress || {};
+            if (status.status === 'running' && num_lines) {
+                const percent = Math.round(100 * lines_done / num_lines);
+                this.showStatus(`Converting image to wave patterns... ${percent}%`, 'processing');
+            } else {
+                this.showStatus('Waiting for a free converter...', 'processing');
+            }
+
+            await new Promise(resolve => setTimeout(resolve, 100));
+        }
+    }
+
     isValidImageFile(file) {
         const validTypes = ['image/png', 'image/jpeg', 'image/jpg', 'image/gif', 'image/bmp', 'image/tiff'];
         return validTypes.includes(file.type);
@@ -187,16 +235,26 @@ class ImageWaveApp {
         // Set original image
         this.originalImage.src = data.original_image;
 
-        // Load and display SVG
-        try {
-            // Add cache-busting timestamp to prevent browser caching issues
-            const svgUrl = `${data.svg_file}?t=${Date.now()}`;
-            const svgResponse = await fetch(svgUrl);
-            const svgContent = await svgResponse.text();
-            this.svgViewer.innerHTML = svgContent;
-        } catch (error) {
-            console.error('Error loading SVG:', error);
-            this.svgViewer.innerHTML = '<p>Error loading SVG</p>';
+        // Show raster tiles where the server has them, so large SVGs are
+        // only loaded by View SVG and the downloads
+        const tileInfo = await this.loadTileInfo(data.id);
+        if (tileInfo) {
+            this.svgViewer.innerHTML = '';
+        } else {
+            // Load and display SVG
+            try {
+                // Add cache-busting timestamp to prevent browser caching issues
+                const svgUrl = `${data.svg_file}?t=${Date.now()}`;
+                const svgResponse = await fetch(svgUrl);
+                const svgContent = await svgResponse.text();
+                this.svgViewer.innerHTML = svgContent;
+            } catch (error) {
+                console.error('Error loading SVG:', error);
+                this.svgViewer.innerHTML = '<p>Error loading SVG</p>';
+            }
+        }
+        if (window.viewer) {
+            window.viewer.showTiles(tileInfo);
         }
 
         // Update info
@@ -231,6 +289,17 @@ class ImageWaveApp {
         }
     }
 
+    async loadTileInfo(fileId) {
+        // Tile pyramid of a conversion, or null if the server has none for it
+        try {
+            const response = await fetch(`/tiles/${fileId}/info.json?t=${Date.now()}`);
+            return response.ok ? await response.json() : null;
+        } catch (error) {
+            console.error('Error loading tile info:', error);
+            return null;
+        }
+    }
+
     async loadConfiguration() {
         console.log('Loading configuration...');
         try {
@@ -258,7 +327,12 @@ class ImageWaveApp {
         this.amplitudeMaxInput.value = config.amplitude_max;
         this.widthMinInput.value = config.stroke_width_min;
         this.widthMaxInput.value = config.stroke_width_max;
+        this.toneCurveInput.value = config.tone_curve;
         this.lineHeightInput.value = config.line_height;
+        this.pathModeInput.value = config.path_mode;
+        this.bezierToleranceInput.value = config.bezier_tolerance;
+        this.targetWidthInput.value = config.target_width;
+        this.targetLinesInput.value = config.target_lines;
         console.log('Config inputs populated');
     }
 
@@ -275,7 +349,12 @@ class ImageWaveApp {
             amplitude_max: parseFloat(this.amplitudeMaxInput.value),
             stroke_width_min: parseFloat(this.widthMinInput.value),
             stroke_width_max: parseFloat(this.widthMaxInput.value),
-            line_height: parseInt(this.lineHeightInput.value)
+            tone_curve: this.toneCurveInput.value.trim() || 'linear',
+            line_height: parseInt(this.lineHeightInput.value),
+            path_mode: this.pathModeInput.value,
+            bezier_tolerance: parseFloat(this.bezierToleranceInput.value),
+            target_width: parseInt(this.targetWidthInput.value) || 0,
+            target_lines: parseInt(this.targetLinesInput.value) || 0
         };
 
         console.log('Configuration to send:', config);
@@ -343,7 +422,8 @@ class ImageWaveApp {
 
             if (response.ok) {
                 const data = await response.json();
-                this.currentData = { ...this.currentData, ...data };
+                const result = await this.waitForConversion(data.id);
+                this.currentData = { ...this.currentData, ...data, ...result };
                 await this.displayResults(this.currentData, viewState);
             } else {
                 const error = await response.json();
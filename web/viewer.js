@@ -1,3 +1,87 @@
+class TileLayer {
+    // Shows a server-side tile pyramid in a scroll container, fetching only the tiles in view
+    constructor(container) {
+        this.container = container;
+        this.element = document.createElement('div');
+        this.element.className = 'tile-layer';
+        this.element.style.display = 'none';
+        container.appendChild(this.element);
+        this.info = null;
+        this.level = null;
+        this.tiles = new Map();
+    }
+
+    load(info) {
+        this.clear();
+        this.info = info;
+        this.element.style.width = `${info.width}px`;
+        this.element.style.height = `${info.height}px`;
+        this.element.style.display = '';
+    }
+
+    clear() {
+        this.info = null;
+        this.level = null;
+        this.tiles.clear();
+        this.element.innerHTML = '';
+        this.element.style.display = 'none';
+    }
+
+    update(zoom) {
+        if (!this.info) return;
+        const { width, height, tile_size, native_level, max_level } = this.info;
+
+        // The coarsest level with at least one tile pixel per screen pixel
+        const wanted = native_level + Math.ceil(Math.log2(zoom * (window.devicePixelRatio || 1)));
+        const level = Math.max(0, Math.min(max_level, wanted));
+        if (level !== this.level) {
+            this.tiles.forEach(tile => tile.remove());
+            this.tiles.clear();
+            this.level = level;
+        }
+
+        const scale = Math.pow(2, level - native_level);
+        const levelWidth = Math.ceil(width * scale);
+        const levelHeight = Math.ceil(height * scale);
+        const span = tile_size / scale;  // image pixels covered by one tile
+
+        // Visible area in image pixels; the layer is scaled by zoom from its top left corner
+        const left = this.container.scrollLeft / zoom;
+        const top = this.container.scrollTop / zoom;
+        const right = left + this.container.clientWidth / zoom;
+        const bottom = top + this.container.clientHeight / zoom;
+        const lastX = Math.min(Math.ceil(levelWidth / tile_size), Math.ceil(right / span)) - 1;
+        const lastY = Math.min(Math.ceil(levelHeight / tile_size), Math.ceil(bottom / span)) - 1;
+
+        const visible = new Set();
+        for (let y = Math.max(0, Math.floor(top / span)); y <= lastY; y++) {
+            for (let x = Math.max(0, Math.floor(left / span)); x <= lastX; x++) {
+                const key = `${x}/${y}`;
+                visible.add(key);
+                if (this.tiles.has(key)) continue;
+
+                const tile = document.createElement('img');
+                tile.src = this.info.url.replace('{z}', level).replace('{x}', x).replace('{y}', y);
+                tile.draggable = false;
+                tile.style.left = `${x * span}px`;
+                tile.style.top = `${y * span}px`;
+                tile.style.width = `${Math.min(tile_size, levelWidth - x * tile_size) / scale}px`;
+                tile.style.height = `${Math.min(tile_size, levelHeight - y * tile_size) / scale}px`;
+                this.element.appendChild(tile);
+                this.tiles.set(key, tile);
+            }
+        }
+
+        // Drop tiles scrolled out of view
+        for (const [key, tile] of this.tiles) {
+            if (!visible.has(key)) {
+                tile.remove();
+                this.tiles.delete(key);
+            }
+        }
+    }
+}
+
 class DualViewer {
     constructor() {
         this.currentZoom = 1;
@@ -19,6 +103,7 @@ class DualViewer {
         this.svgContainer = document.getElementById('svgContainer');
         this.originalImage = document.getElementById('originalImage');
         this.svgViewer = document.getElementById('svgViewer');
+        this.tileLayer = new TileLayer(this.svgContainer);
     }
 
     bindEvents() {
@@ -54,6 +139,7 @@ class DualViewer {
 
         this.svgContainer.addEventListener('scroll', () => {
             this.syncScroll(this.svgContainer, this.originalContainer);
+            this.tileLayer.update(this.currentZoom);
         });
     }
 
@@ -111,6 +197,21 @@ class DualViewer {
             svgElement.style.transform = transform;
             svgElement.style.transformOrigin = 'top left';
         }
+
+        // Apply to tiles, then fetch the ones now in view
+        if (this.tileLayer.info) {
+            this.tileLayer.element.style.transform = transform;
+            this.tileLayer.update(this.currentZoom);
+        }
+    }
+
+    showTiles(info) {
+        // Show the result as tiles, or clear them if info is null
+        if (info) {
+            this.tileLayer.load(info);
+        } else {
+            this.tileLayer.clear();
+        }
     }
 
     handleWheelZoom(e) {